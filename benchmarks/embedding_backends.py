@@ -0,0 +1,136 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+
+from synthetic_repo import source_file
+
+# Compares embedding backends on model load time, chunks/s, memory and retrieval agreement.
+# Agreement is measured against the first backend, normally the current PyTorch model. It is
+# the share of each query chunk's top-k nearest chunks that a backend also returns, plus the
+# mean cosine between the two vectors of each chunk when the dimensions match. Each backend
+# runs in its own process. Entries are an EMBEDDING_BACKEND (torch, onnx, onnx-int8) for
+# --model, or "<model>#<backend>" for another model. The models must already be in the local
+# Hugging Face cache unless downloads are allowed. Run from the repository root:
+#   python benchmarks/embedding_backends.py --backends torch,onnx,onnx-int8 --chunks 500 --threads 4
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def corpus(count, seed=1):
+    # Code chunks of about the size CodeSummarization splits documents into
+    rng = random.Random(seed)
+    return [source_file(rng, f"module_{index}", rng.randint(50, 80)) for index in range(count)]
+
+
+def model_spec(entry, model):
+    return entry if "#" in entry else (model if entry == "torch" else f"{model}#{entry}")
+
+
+def run_backend(args):
+    sys.path.insert(0, REPO_ROOT)
+    from model_registry import ModelRegistry
+    from utility import Utility
+
+    texts = corpus(args.chunks)
+    rss_start = Utility.get_rss_mb()
+    start = time.perf_counter()
+    embeddings = ModelRegistry.get_embeddings(args.spec)
+    load_seconds = time.perf_counter() - start
+    rss_loaded = Utility.get_rss_mb()
+
+    embeddings.embed_documents(texts[:8])  # warm up
+    start = time.perf_counter()
+    vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+    encode_seconds = time.perf_counter() - start
+    np.save(args.output, vectors)
+
+    return {
+        "spec": args.spec,
+        "load_seconds": load_seconds,
+        "chunks_per_second": len(texts) / encode_seconds,
+        "rss_model_mb": rss_loaded - rss_start,
+        "rss_mb": Utility.get_rss_mb(),
+    }
+
+
+def top_k(vectors, queries, k):
+    normalized = vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+    scores = normalized[:queries] @ normalized.T
+    scores[np.arange(queries), np.arange(queries)] = -np.inf  # a chunk is not its own neighbour
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def agreement(baseline, vectors, queries, k):
+    expected = top_k(baseline, queries, k)
+    found = top_k(vectors, queries, k)
+    overlap = np.mean([len(set(a) & set(b)) / k for a, b in zip(expected, found)])
+    cosine = None
+    if baseline.shape == vectors.shape:
+        norms = np.linalg.norm(baseline, axis=1) * np.linalg.norm(vectors, axis=1)
+        cosine = float(np.mean(np.sum(baseline * vectors, axis=1) / np.clip(norms, 1e-12, None)))
+    return float(overlap), cosine
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare embedding backends on speed, memory and retrieval agreement.")
+    parser.add_argument("--model", default="sentence-transformers/all-mpnet-base-v2", help="EMBEDDING_MODEL for entries without a model.")
+    parser.add_argument("--backends", default="torch,onnx,onnx-int8", help="Comma separated entries; the first one is the baseline.")
+    parser.add_argument("--chunks", type=int, default=500, help="Number of code chunks to encode.")
+    parser.add_argument("--queries", type=int, default=100, help="Chunks whose nearest neighbours are compared.")
+    parser.add_argument("-k", type=int, default=10, help="Neighbours per query, as used by process_file.")
+    parser.add_argument("--threads", type=int, help="EMBEDDING_THREADS for every backend.")
+    parser.add_argument("--batch-size", type=int, default=32, help="EMBEDDING_BATCH_SIZE for every backend.")
+    parser.add_argument("--spec", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.spec:
+        print(json.dumps(run_backend(args)))
+        return
+
+    env = dict(os.environ, EMBEDDING_BATCH_SIZE=str(args.batch_size), LOG_LEVEL="ERROR")
+    if args.threads:
+        env["EMBEDDING_THREADS"] = str(args.threads)
+
+    workdir = tempfile.mkdtemp(prefix="cheekyai-embeddings-")
+    results = []
+    try:
+        for entry in args.backends.split(","):
+            spec = model_spec(entry.strip(), args.model)
+            output = os.path.join(workdir, f"{len(results)}.npy")
+            command = [sys.executable, os.path.abspath(__file__), "--spec", spec, "--output", output,
+                       "--chunks", str(args.chunks)]
+            completed = subprocess.run(command, cwd=REPO_ROOT, env=env, capture_output=True, text=True)
+            if completed.returncode != 0:
+                print(f"{spec}: failed\n{completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else ''}")
+                continue
+            result = json.loads(completed.stdout.strip().splitlines()[-1])
+            result["vectors"] = np.load(output)
+            results.append(result)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if not results:
+        sys.exit(1)
+    queries = min(args.queries, args.chunks)
+    baseline = results[0]["vectors"]
+    print(f"{args.chunks} chunks, top-{args.k} of {queries} queries, threads {args.threads or 'default'}, "
+          f"baseline {results[0]['spec']}\n")
+    print(f"{'backend':<50} {'load s':>7} {'chunks/s':>9} {'model MB':>9} {'RSS MB':>7} {'top-k agree':>12} {'cosine':>7}")
+    for result in results:
+        overlap, cosine = agreement(baseline, result["vectors"], queries, args.k)
+        print(f"{result['spec']:<50} {result['load_seconds']:>7.2f} {result['chunks_per_second']:>9.1f} "
+              f"{result['rss_model_mb']:>9.1f} {result['rss_mb']:>7.1f} {overlap:>12.1%} "
+              f"{'-' if cosine is None else f'{cosine:.4f}':>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Minimal OpenAI-compatible chat completions server for offline benchmarks. Every request
+# waits --latency-ms before answering, streamed answers send a token every
+# 1 / --tokens-per-second seconds. Point CheekyAI at it with URI=http://127.0.0.1:<port>/v1.
+#   python benchmarks/fake_llm_server.py --port 8765 --latency-ms 300
+
+SUMMARY = "Updated the module functions to adjust the computed result values."
+JUDGE = "Confidence: 75%"
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    token_interval = 0.0
+    requests = 0
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        # Request count, read by the benchmark runner
+        if self.path.rstrip("/").endswith("/stats"):
+            self.send_json({"requests": FakeLLMHandler.requests})
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with FakeLLMHandler.lock:
+            FakeLLMHandler.requests += 1
+
+        prompt = json.dumps(body.get("messages", []))
+        text = JUDGE if "confidence percentage" in prompt.lower() else SUMMARY
+        time.sleep(self.latency)
+
+        if body.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            for word in text.split(" "):
+                self.wfile.write(f"data: {json.dumps(self.completion_chunk(body, word + ' '))}\n\n".encode("utf-8"))
+                self.wfile.flush()
+                time.sleep(self.token_interval)
+            self.wfile.write(b"data: [DONE]\n\n")
+            return
+
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = len(text) // 4
+        self.send_json({
+            "id": "chatcmpl-benchmark",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "benchmark"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens},
+        })
+
+    @staticmethod
+    def completion_chunk(body, content):
+        return {
+            "id": "chatcmpl-benchmark",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": body.get("model", "benchmark"),
+            "choices": [{"index": 0, "delta": {"content": content}, "finish_reason": None}],
+        }
+
+    def send_json(self, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake OpenAI-compatible server for benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=200, help="Delay before every response.")
+    parser.add_argument("--tokens-per-second", type=float, default=50, help="Token rate of streamed responses.")
+    args = parser.parse_args()
+
+    FakeLLMHandler.latency = args.latency_ms / 1000
+    FakeLLMHandler.token_interval = 1 / args.tokens_per_second if args.tokens_per_second > 0 else 0
+    server = ThreadingHTTPServer((args.host, args.port), FakeLLMHandler)
+    print(f"Fake LLM server on http://{args.host}:{args.port}/v1", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import os
+import sys
+import json
+import zlib
+import random
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+
+from synthetic_repo import git, source_file
+
+# Peak memory of preparing one very large commit, at growing diff sizes. Each size gets a
+# repository whose second commit rewrites every file, and a child process runs
+# CodeSummarization.prepare_code_diff on it: the diff, the change set, every file's content
+# reduced to its changed regions, splitting, embedding and the vector index, everything before
+# the LLM is called. Unless --model names a real EMBEDDING_MODEL, the encoder is replaced by
+# deterministic vectors of the same size, so the run measures the pipeline rather than the
+# model. The streaming path must stay within --max-growth-mb of the smallest size; --legacy
+# also measures passing the whole diff as one string for comparison. Run from the repository root:
+#   python benchmarks/large_commit_memory.py --sizes-mb 16,64,256 --memory-mb 32 --legacy
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HASH_MODEL = "benchmark-hash"
+
+
+def generate_large_commit(path, size_mb, file_kb, seed=1):
+    rng = random.Random(seed)
+    os.makedirs(os.path.join(path, "pkg"), exist_ok=True)
+    git(path, "init", "-q", "-b", "main")
+    git(path, "config", "user.email", "bench@example.com")
+    git(path, "config", "user.name", "Benchmark")
+
+    # source_file writes about 30 bytes per line
+    lines = file_kb * 1024 // 30
+    names = [f"pkg/module_{index}.py" for index in range(max(1, size_mb * 1024 // file_kb))]
+    for name in names:
+        with open(os.path.join(path, name), "w") as file:
+            file.write(source_file(rng, "base", lines))
+    git(path, "add", "-A")
+    git(path, "commit", "-q", "-m", "Initial import")
+
+    for name in names:
+        with open(os.path.join(path, name), "w") as file:
+            file.write(source_file(rng, "rewritten", lines))
+    git(path, "add", "-A")
+    git(path, "commit", "-q", "-m", "Rewrite every module")
+    return path
+
+
+class HashEmbeddings:
+    # Stands in for the embedding model: a deterministic vector per text, returned as lists of
+    # floats like the sentence-transformers models do
+
+    def __init__(self, dimensions=768):
+        self.dimensions = dimensions
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        rng = np.random.default_rng(zlib.crc32(text.encode("utf-8")))
+        return rng.standard_normal(self.dimensions, dtype=np.float32).tolist()
+
+
+def prepare(repo, legacy):
+    # Runs in the child process; returns what was prepared, so nothing is optimized away
+    sys.path.insert(0, REPO_ROOT)
+    from model_registry import ModelRegistry
+    from git_repo_manager import GitRepoManager
+    from commit_analysis import CodeSummarization
+    from utility import Utility
+
+    if os.environ["EMBEDDING_MODEL"] == HASH_MODEL:
+        ModelRegistry._embeddings[ModelRegistry.embedding_model()] = HashEmbeddings()
+
+    def clean(text):
+        return Utility.cleanTripleSlashes(Utility.cleanTripleQuotes(text))
+
+    manager = GitRepoManager(repo)
+    summarization = CodeSummarization(manager)
+    if legacy:
+        code_diff = clean(manager.get_changes("HEAD"))
+        diff_bytes = len(code_diff.encode("utf-8"))
+    else:
+        code_diff = manager.stream_changes("HEAD", clean)
+        diff_bytes = code_diff.size
+
+    prepared = summarization.prepare_code_diff("HEAD", code_diff)
+    vectorstore = prepared["vectorstore"]
+    result = {
+        "files": len(prepared["files"]),
+        "rag_files": sum(1 for strategy, _, _ in prepared["contexts"].values() if strategy == "rag"),
+        "diff_bytes": diff_bytes,
+        "index_spilled": bool(getattr(vectorstore, "spilled", None)),
+    }
+    if vectorstore is not None:
+        vectorstore.delete_collection()
+    return result
+
+
+def measure(repo, memory_mb, legacy, model):
+    env = dict(os.environ, COMMIT_MEMORY_MB=str(memory_mb), LOG_LEVEL="ERROR", EMBEDDING_MODEL=model,
+               EMBEDDING_CACHE="False", LLM_CACHE="False", REPO_INDEX="False", TRIAGE="False",
+               CACHE_DIR=os.path.join(os.path.dirname(repo), "cache"))
+    env.setdefault("OPENAI_API_KEY", "benchmark")  # the LLM client is created but never called
+    command = [sys.executable, os.path.abspath(__file__), "--child", repo] + (["--legacy"] if legacy else [])
+    process = subprocess.Popen(command, env=env, stdout=subprocess.PIPE, text=True)
+    output = process.stdout.read()
+    # wait4 reports the resource usage of this child alone; ru_maxrss is in KB on Linux
+    _, status, usage = os.wait4(process.pid, 0)
+    if os.waitstatus_to_exitcode(status) != 0:
+        raise RuntimeError(f"Preparing {repo} failed")
+    return usage.ru_maxrss / 1024, json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that the peak memory of preparing a commit stays bounded as its diff grows.")
+    parser.add_argument("--sizes-mb", default="16,64,256", help="Comma separated sizes of the rewritten files per commit, in MB.")
+    parser.add_argument("--file-kb", type=int, default=512, help="Size of every file.")
+    parser.add_argument("--memory-mb", type=int, default=32, help="COMMIT_MEMORY_MB for the child process.")
+    parser.add_argument("--max-growth-mb", type=float, default=64, help="Allowed peak RSS growth from the smallest to the largest size.")
+    parser.add_argument("--legacy", action="store_true", help="Also measure with the whole diff passed as one string.")
+    parser.add_argument("--model", default=HASH_MODEL, help="EMBEDDING_MODEL to embed with; by default deterministic vectors stand in for the model.")
+    parser.add_argument("--child", metavar="REPO", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(prepare(args.child, args.legacy)))
+        return
+
+    sizes = [int(size) for size in args.sizes_mb.split(",")]
+    workdir = tempfile.mkdtemp(prefix="cheekyai-memory-")
+    results = []
+    try:
+        for size in sizes:
+            repo = generate_large_commit(os.path.join(workdir, f"repo-{size}"), size, args.file_kb)
+            streaming_mb, prepared = measure(repo, args.memory_mb, False, args.model)
+            legacy_mb = measure(repo, args.memory_mb, True, args.model)[0] if args.legacy else None
+            results.append((size, prepared, streaming_mb, legacy_mb))
+            shutil.rmtree(repo, ignore_errors=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"COMMIT_MEMORY_MB={args.memory_mb}, {args.file_kb} KB per file, embeddings {args.model}\n")
+    print(f"{'size MB':>8} {'files':>6} {'RAG files':>10} {'diff MB':>8} {'index on disk':>14} {'streaming RSS MB':>17}"
+          + (f" {'legacy RSS MB':>14}" if args.legacy else ""))
+    for size, prepared, streaming_mb, legacy_mb in results:
+        print(f"{size:>8} {prepared['files']:>6} {prepared['rag_files']:>10} {prepared['diff_bytes'] / 1048576:>8.1f} "
+              f"{'yes' if prepared['index_spilled'] else 'no':>14} {streaming_mb:>17.1f}"
+              + (f" {legacy_mb:>14.1f}" if legacy_mb is not None else ""))
+
+    growth = results[-1][2] - results[0][2]
+    if growth > args.max_growth_mb:
+        print(f"\nFAIL: peak RSS grew by {growth:.1f} MB from {sizes[0]} MB to {sizes[-1]} MB (limit {args.max_growth_mb:.0f} MB)")
+        sys.exit(1)
+    print(f"\nOK: peak RSS grew by {growth:.1f} MB from {sizes[0]} MB to {sizes[-1]} MB (limit {args.max_growth_mb:.0f} MB)")
+
+
+if __name__ == "__main__":
+    main()
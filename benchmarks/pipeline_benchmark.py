@@ -0,0 +1,157 @@
+import os
+import re
+import sys
+import json
+import time
+import socket
+import shutil
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+
+from synthetic_repo import add_arguments, generate_from_arguments
+
+# End-to-end benchmark without network access: generates a synthetic repository, starts the
+# fake LLM server and runs `cheekyAI.py --batch` against both, reporting wall time, commits/min,
+# peak RSS and per-stage times taken from the INFO log. The embedding model must already be in
+# the local Hugging Face cache. Run from the repository root:
+#   python benchmarks/pipeline_benchmark.py --commits 10 --latency-ms 200 --runs 2
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Log lines of the summarization pipeline and the stage each one times
+STAGE_PATTERNS = {
+    "model load": re.compile(r"Loaded (?:embeddings|llm):.* in ([\d.]+)s"),
+    "load documents": re.compile(r"Loaded \d+ documents in ([\d.]+)s"),
+    "split": re.compile(r"Split \d+ documents into \d+ chunks in ([\d.]+)s"),
+    "embed": re.compile(r"Embedded \d+ of \d+ chunks in ([\d.]+)s"),
+    "index": re.compile(r"Indexed \d+ chunks in ([\d.]+)s"),
+    "file summaries": re.compile(r"Summarized \d+ files in ([\d.]+)s"),
+}
+STAGE_TIMINGS = re.compile(r"Stage timings: (.*)")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port, latency_ms, tokens_per_second):
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(BENCHMARK_DIR, "fake_llm_server.py"), "--port", str(port),
+         "--latency-ms", str(latency_ms), "--tokens-per-second", str(tokens_per_second)],
+        stdout=subprocess.PIPE, text=True
+    )
+    server.stdout.readline()  # printed once the server listens
+    return server
+
+
+def server_requests(port):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/v1/stats") as response:
+        return json.load(response)["requests"]
+
+
+def parse_stage_times(log):
+    stages = {}
+    for line in log.splitlines():
+        for stage, pattern in STAGE_PATTERNS.items():
+            match = pattern.search(line)
+            if match:
+                stages[stage] = stages.get(stage, 0.0) + float(match.group(1))
+        match = STAGE_TIMINGS.search(line)
+        if match:
+            for entry in filter(None, match.group(1).split(", ")):
+                name, _, seconds = entry.rpartition(" ")
+                stages[f"pipeline {name}"] = stages.get(f"pipeline {name}", 0.0) + float(seconds.rstrip("s"))
+    return stages
+
+
+def run_cheekyai(repo, port, cache_dir, compare):
+    env = dict(os.environ)
+    env.update({
+        "URI": f"http://127.0.0.1:{port}/v1",
+        "OPENAI_API_KEY": env.get("OPENAI_API_KEY") or "benchmark",
+        "DEVPATH": repo,
+        "MAINBRANCH": "main",
+        "CACHE_DIR": cache_dir,
+        "LOG_LEVEL": "INFO",
+        "HF_HUB_OFFLINE": "1",
+        "TRANSFORMERS_OFFLINE": "1",
+    })
+    command = [sys.executable, os.path.join(REPO_ROOT, "cheekyAI.py"), "--batch", "--compare" if compare else "--silent", "--nobreak"]
+
+    with tempfile.TemporaryFile(mode="w+") as console, tempfile.TemporaryFile(mode="w+") as log:
+        start = time.perf_counter()
+        process = subprocess.Popen(command, cwd=repo, env=env, stdout=console, stderr=log, text=True)
+        # wait4 reports the resource usage of this child alone; ru_maxrss is in KB on Linux
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        wall = time.perf_counter() - start
+        console.seek(0)
+        log.seek(0)
+        console_output = console.read()
+        output = log.read()
+
+    # A failed comparison exits with 1 as well, so look for errors in the output
+    errors = [line.strip() for line in console_output.splitlines() if "error occurred" in line]
+    if process.returncode not in (0, 1) or errors:
+        details = "\n".join(errors) or output[-2000:]
+        raise RuntimeError(f"cheekyAI.py exited with {process.returncode}:\n{details}")
+    return wall, usage.ru_maxrss / 1024, parse_stage_times(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CheekyAI end to end against a synthetic repository and a fake LLM.")
+    add_arguments(parser)
+    parser.add_argument("--latency-ms", type=float, default=200, help="Latency of every fake LLM response.")
+    parser.add_argument("--tokens-per-second", type=float, default=50, help="Token rate of streamed fake LLM responses.")
+    parser.add_argument("--runs", type=int, default=1, help="Number of runs over the same repository.")
+    parser.add_argument("--warm", action="store_true", help="Keep the embedding and LLM caches between runs.")
+    parser.add_argument("--compare", action="store_true", help="Also compare every message, as in CI.")
+    parser.add_argument("--json", help="Write the results to this file, e.g. to keep as a baseline.")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="cheekyai-bench-")
+    port = free_port()
+    server = start_server(port, args.latency_ms, args.tokens_per_second)
+    results = []
+    try:
+        repo = generate_from_arguments(os.path.join(workdir, "repo"), args)
+        for run in range(args.runs):
+            cache_dir = os.path.join(workdir, "cache" if args.warm else f"cache-{run}")
+            requests_before = server_requests(port)
+            wall, peak_rss_mb, stages = run_cheekyai(repo, port, cache_dir, args.compare)
+            results.append({
+                "run": run + 1,
+                "wall_seconds": round(wall, 3),
+                "commits_per_minute": round(args.commits / wall * 60, 2),
+                "peak_rss_mb": round(peak_rss_mb, 1),
+                "llm_requests": server_requests(port) - requests_before,
+                "stages": {stage: round(seconds, 3) for stage, seconds in stages.items()},
+            })
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{args.commits} commits, {args.files_per_commit} files/commit, {args.hunks} hunks/file, "
+          f"{args.file_lines} lines/file; fake LLM latency {args.latency_ms:.0f} ms\n")
+    print(f"{'run':<4} {'wall s':>8} {'commits/min':>12} {'peak RSS MB':>12} {'LLM requests':>13}")
+    for result in results:
+        print(f"{result['run']:<4} {result['wall_seconds']:>8.2f} {result['commits_per_minute']:>12.1f} "
+              f"{result['peak_rss_mb']:>12.1f} {result['llm_requests']:>13}")
+    for result in results:
+        print(f"\nStage times of run {result['run']} (summed over commits):")
+        for stage, seconds in result["stages"].items():
+            print(f"  {stage:<24} {seconds:8.2f} s")
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"parameters": vars(args), "runs": results}, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
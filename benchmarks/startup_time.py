@@ -0,0 +1,75 @@
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+# Checks CheekyAI's startup cost against a budget, so heavy imports creeping back into the
+# fast path (--help, --simulate, empty ranges) are caught. Run from the repository root:
+#   python benchmarks/startup_time.py --budget-ms 800
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must only be imported once a summary is actually requested
+HEAVY_MODULES = ["langchain", "langchain_core", "langchain_openai", "langchain_community", "chromadb", "sentence_transformers", "torch"]
+
+
+def import_times(module):
+    # Run `python -X importtime` and return {module: (self_us, cumulative_us)}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def help_wall_time(runs):
+    # Best of several runs of `cheekyAI.py --help`, including interpreter startup
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "cheekyAI.py", "--help"], cwd=REPO_ROOT, capture_output=True, check=True)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure CheekyAI startup time against a budget.")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("STARTUP_BUDGET_MS", "800")), help="Maximum cumulative import time of cheekyAI in milliseconds.")
+    parser.add_argument("--runs", type=int, default=5, help="Number of --help runs; the fastest one is reported.")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest imports to list.")
+    args = parser.parse_args()
+
+    times = import_times("cheekyAI")
+    total_ms = times["cheekyAI"][1] / 1000
+    heavy = sorted(name for name in times if name.split(".")[0] in HEAVY_MODULES)
+
+    print(f"import cheekyAI: {total_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    print(f"cheekyAI.py --help: {help_wall_time(args.runs) * 1000:.1f} ms wall time (best of {args.runs})")
+    print("\nSlowest imports (cumulative):")
+    for name, (_, cumulative_us) in sorted(times.items(), key=lambda item: item[1][1], reverse=True)[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    failed = False
+    if heavy:
+        print(f"\nFAIL: heavy modules imported at startup: {', '.join(heavy[:10])}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print(f"\nFAIL: startup import time {total_ms:.1f} ms exceeds the {args.budget_ms:.0f} ms budget")
+        failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
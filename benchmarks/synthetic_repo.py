@@ -0,0 +1,124 @@
+import os
+import random
+import argparse
+import subprocess
+
+# Generates a reproducible git repository for benchmarks: a main branch with a base tree and a
+# feature branch whose commits modify, add, rename and delete files with a configurable number
+# of hunks. Run from the repository root:
+#   python benchmarks/synthetic_repo.py /tmp/synthetic --commits 20 --files-per-commit 5
+
+
+def git(path, *args):
+    subprocess.run(["git", *args], cwd=path, check=True, capture_output=True)
+
+
+def source_file(rng, module, lines):
+    # Python-looking content, so scope-aware context windowing has functions to work with
+    functions = []
+    for index in range(max(1, lines // 6)):
+        functions.append(
+            f"def {module}_function_{index}(value):\n"
+            f"    # Step {index} of the {module} module\n"
+            f"    result = value * {rng.randint(2, 99)} + {rng.randint(0, 999)}\n"
+            f"    if result % {rng.randint(2, 9)} == 0:\n"
+            f"        return result // 2\n"
+            f"    return result\n"
+        )
+    return "".join(functions)
+
+
+def modify(rng, content, hunks):
+    # Rewrites one line in each of `hunks` evenly spread regions of the file
+    lines = content.splitlines(keepends=True)
+    step = max(1, len(lines) // max(1, hunks))
+    for region in range(hunks):
+        line = min(len(lines) - 1, region * step + rng.randint(0, max(0, step - 1)))
+        indent = lines[line][:len(lines[line]) - len(lines[line].lstrip())]
+        lines[line] = f"{indent}result = value - {rng.randint(0, 9999)}  # changed\n"
+    return "".join(lines)
+
+
+def generate_repo(path, commits=10, files_per_commit=4, hunks_per_file=3, file_lines=300, base_files=40,
+                  new_files=1, renames=1, deletes=1, seed=1):
+    rng = random.Random(seed)
+    os.makedirs(path, exist_ok=True)
+    git(path, "init", "-q", "-b", "main")
+    git(path, "config", "user.email", "bench@example.com")
+    git(path, "config", "user.name", "Benchmark")
+
+    files = []
+    for index in range(base_files):
+        name = f"pkg/module_{index}.py"
+        os.makedirs(os.path.join(path, "pkg"), exist_ok=True)
+        with open(os.path.join(path, name), "w") as file:
+            file.write(source_file(rng, f"module_{index}", file_lines))
+        files.append(name)
+    git(path, "add", "-A")
+    git(path, "commit", "-q", "-m", "Initial import")
+    git(path, "checkout", "-q", "-b", "feature")
+
+    created = base_files
+    for number in range(commits):
+        for name in rng.sample(files, min(files_per_commit, len(files))):
+            with open(os.path.join(path, name)) as file:
+                content = file.read()
+            with open(os.path.join(path, name), "w") as file:
+                file.write(modify(rng, content, hunks_per_file))
+
+        for _ in range(new_files):
+            name = f"pkg/module_{created}.py"
+            with open(os.path.join(path, name), "w") as file:
+                file.write(source_file(rng, f"module_{created}", file_lines))
+            files.append(name)
+            created += 1
+
+        git(path, "add", "-A")
+        for _ in range(min(renames, len(files) - 1)):
+            old_name = rng.choice(files)
+            new_name = old_name.replace(".py", f"_v{number}.py")
+            git(path, "mv", old_name, new_name)
+            files[files.index(old_name)] = new_name
+
+        for _ in range(min(deletes, len(files) - 1)):
+            name = rng.choice(files)
+            git(path, "rm", "-q", "-f", name)
+            files.remove(name)
+
+        git(path, "add", "-A")
+        git(path, "commit", "-q", "-m", f"Change {number}: update {files_per_commit} modules")
+    return path
+
+
+def add_arguments(parser):
+    parser.add_argument("--commits", type=int, default=10, help="Commits on the feature branch.")
+    parser.add_argument("--files-per-commit", type=int, default=4, help="Existing files modified per commit.")
+    parser.add_argument("--hunks", type=int, default=3, help="Hunks per modified file.")
+    parser.add_argument("--file-lines", type=int, default=300, help="Approximate lines per file.")
+    parser.add_argument("--base-files", type=int, default=40, help="Files in the initial commit.")
+    parser.add_argument("--new-files", type=int, default=1, help="Files added per commit.")
+    parser.add_argument("--renames", type=int, default=1, help="Files renamed per commit.")
+    parser.add_argument("--deletes", type=int, default=1, help="Files deleted per commit.")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed; the same seed gives the same repository.")
+
+
+def generate_from_arguments(path, args):
+    return generate_repo(path, commits=args.commits, files_per_commit=args.files_per_commit, hunks_per_file=args.hunks,
+                         file_lines=args.file_lines, base_files=args.base_files, new_files=args.new_files,
+                         renames=args.renames, deletes=args.deletes, seed=args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic git repository for benchmarks.")
+    parser.add_argument("path", help="Directory to create the repository in; it must not exist yet.")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    if os.path.exists(args.path):
+        parser.error(f"{args.path} already exists")
+    generate_from_arguments(args.path, args)
+    print(f"Created {args.path}: {args.commits} commits on 'feature' over 'main'")
+
+
+if __name__ == "__main__":
+    main()
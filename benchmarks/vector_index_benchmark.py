@@ -0,0 +1,124 @@
+import os
+import sys
+import json
+import time
+import argparse
+import hashlib
+import subprocess
+
+# Compares the built-in NumPy vector index against Chroma on import, build and filtered top-k
+# query latency, and on resident memory. Each backend runs in its own process, so import
+# costs and memory are not shared. Embeddings are random vectors, no model is loaded.
+# Run from the repository root:
+#   python benchmarks/vector_index_benchmark.py --chunks 2000 --sources 50
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+
+class RandomEmbeddings:
+    # Deterministic vector per text, so both backends index identical data
+    def __init__(self, dim):
+        self.dim = dim
+
+    def vector(self, text):
+        import numpy as np
+        return np.random.default_rng(int(hashlib.sha1(text.encode("utf-8")).hexdigest()[:8], 16)).standard_normal(self.dim).astype("float32").tolist()
+
+    def embed_documents(self, texts):
+        return [self.vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.vector(text)
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(percent / 100 * len(ordered)))]
+
+
+def run_backend(args):
+    from utility import Utility
+
+    rss_start = Utility.get_rss_mb()
+    start = time.perf_counter()
+    if args.backend == "chroma":
+        import uuid
+        from langchain_community.vectorstores import Chroma
+        from chromadb.config import Settings as ChromaSettings
+    else:
+        from vector_index import NumpyVectorIndex
+    from langchain.docstore.document import Document
+    import_seconds = time.perf_counter() - start
+
+    embeddings = RandomEmbeddings(args.dim)
+    documents = [
+        Document(page_content=f"chunk {i}", metadata={"source": f"file{i % args.sources}.py"})
+        for i in range(args.chunks)
+    ]
+    # Embed up front so only the index itself is timed
+    vectors = dict(zip((doc.page_content for doc in documents), embeddings.embed_documents([doc.page_content for doc in documents])))
+    embeddings.embed_documents = lambda texts: [vectors[text] for text in texts]
+    rss_before_build = Utility.get_rss_mb()
+
+    start = time.perf_counter()
+    if args.backend == "chroma":
+        index = Chroma.from_documents(documents, embeddings, collection_name=f"bench-{uuid.uuid4().hex}",
+                                      client_settings=ChromaSettings(anonymized_telemetry=False))
+    else:
+        index = NumpyVectorIndex.from_documents(documents, embeddings)
+    build_seconds = time.perf_counter() - start
+
+    latencies = []
+    for i in range(args.queries):
+        retriever = index.as_retriever(search_kwargs={"k": args.k, "filter": {"source": {"$eq": f"file{i % args.sources}.py"}}})
+        start = time.perf_counter()
+        retriever.invoke(f"query {i}")
+        latencies.append(time.perf_counter() - start)
+
+    rss_end = Utility.get_rss_mb()
+    index.delete_collection()
+    return {
+        "backend": args.backend,
+        "import_ms": import_seconds * 1000,
+        "build_ms": build_seconds * 1000,
+        "query_p50_ms": percentile(latencies, 50) * 1000,
+        "query_p99_ms": percentile(latencies, 99) * 1000,
+        "rss_import_mb": rss_before_build - rss_start,
+        "rss_index_mb": rss_end - rss_before_build,
+        "rss_mb": rss_end,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the NumPy vector index with Chroma.")
+    parser.add_argument("--chunks", type=int, default=2000, help="Number of chunks to index.")
+    parser.add_argument("--sources", type=int, default=50, help="Number of source files the chunks belong to.")
+    parser.add_argument("--dim", type=int, default=768, help="Embedding dimension (all-mpnet-base-v2 uses 768).")
+    parser.add_argument("--queries", type=int, default=200, help="Number of filtered top-k queries.")
+    parser.add_argument("-k", type=int, default=10, help="Results per query, as used by process_file.")
+    parser.add_argument("--backend", choices=["numpy", "chroma"], help="Run a single backend in this process and print JSON.")
+    args = parser.parse_args()
+
+    if args.backend:
+        print(json.dumps(run_backend(args)))
+        return
+
+    results = []
+    for backend in ("numpy", "chroma"):
+        command = [sys.executable, os.path.abspath(__file__), "--backend", backend] + sys.argv[1:]
+        completed = subprocess.run(command, cwd=REPO_ROOT, capture_output=True, text=True)
+        if completed.returncode != 0:
+            print(f"{backend}: failed\n{completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else ''}")
+            continue
+        results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    print(f"{args.chunks} chunks in {args.sources} sources, dim {args.dim}, {args.queries} queries with k={args.k}\n")
+    print(f"{'backend':<8} {'import ms':>10} {'build ms':>10} {'p50 ms':>8} {'p99 ms':>8} {'import MB':>10} {'index MB':>9} {'RSS MB':>8}")
+    for result in results:
+        print(f"{result['backend']:<8} {result['import_ms']:>10.1f} {result['build_ms']:>10.1f} {result['query_p50_ms']:>8.3f} "
+              f"{result['query_p99_ms']:>8.3f} {result['rss_import_mb']:>10.1f} {result['rss_index_mb']:>9.1f} {result['rss_mb']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
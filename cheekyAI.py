@@ -2,17 +2,17 @@ import os
 import sys
 import time
 import argparse
+import logging
+import contextlib
 from dotenv import load_dotenv
-import threading
-from queue import Queue
+from concurrent.futures import Future, ThreadPoolExecutor
 from rich.console import Console
 from utility import Utility 
-from commit_analysis import CodeSummarization, CommitMsgComparison
+from pipeline import StagePipeline, StageProgress
+from tracing import tracer
 import git_repo_manager
 from rich import box
-from rich.progress import (
-    BarColumn, Progress, SpinnerColumn, TaskProgressColumn, TimeElapsedColumn, Table
-)
+from rich.progress import Table
 
 class CommitProcessor:
     def __init__(self):
@@ -21,30 +21,20 @@ class CommitProcessor:
             self.URI = os.getenv("URI", "")
             self.MODEL = os.getenv("MODEL", "gpt-3.5-turbo")
             self.console = Console()
-            self.result_queue = Queue()
             self.MAX_RETRIES = 5
             self.VALID_RESPONSES = ["true", "false",True,False]
-            self.done_flag = threading.Event()
+            # Shared by the stages of every commit's pipeline
+            self.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="stage")
             self.GitRepoManager = git_repo_manager.GitRepoManager()
             self.confidence_level = int(os.getenv("CONFIDENCE", "60"))
+            self.code_summary_chain = None
+            self.last_confidence = None
+            self.last_passed = None
         except Exception as e:
             print(f"\n\nUnexpected error occurred: {e}")
             sys.exit(1)
 
 
-    def thinking_animation(self, progress, text):
-        task = progress.add_task(f"[cyan] {text}", total=None)
-        while not self.done_flag.is_set():
-            progress.update(task,advance=1)
-            time.sleep(.5)
-        
-        # Update progress bar to completed state
-        bar_column = next(column for column in progress.columns if isinstance(column, BarColumn))
-        bar_column.style = "green"
-        bar_column.pulse_style = "green"
-        progress.refresh()
-
-
     def output_table(self, commit_message, suggested_commit_message):
         # Create a table
         table = Table(show_header=False, header_style="bold magenta", border_style="white", show_lines=True, box=box.HORIZONTALS, width=80)
@@ -60,100 +50,182 @@ class CommitProcessor:
         tip = "\n[white][bold]Tip:[/bold] Use [reverse]git commit --amend[/reverse] to update the commit message.[/white]\n"
         self.console.print(tip)
 
-    def thinking_threaded(self, target, args, text):
-        try:
-            # Queue for communication of errors
-            error_queue = Queue()
-            def subprocess_function():
-                try:
-                    target(*args)
-                except Exception as e:
-                    error_queue.put(e)
-
-            text_len = len(text)
-            progress_columns = (
-                SpinnerColumn(),
-                "[progress.description]{task.description}",
-                BarColumn(style="black", complete_style="green", finished_style="green", pulse_style="white", bar_width=(57-text_len)),
-                TaskProgressColumn(),
-                "Elapsed:",
-                TimeElapsedColumn(),
-            )
-
-            with Progress(*progress_columns) as progress:
-                # Start the subprocess in a separate thread
-                subprocess_thread = threading.Thread(target=subprocess_function)
-                subprocess_thread.start()
-
-                if not self.silent:
-                    thinking_thread = threading.Thread(target=self.thinking_animation, args=(progress,text))
-                    thinking_thread.start()
-
-                subprocess_thread.join()
-
-                # Check for errors in the subprocess
-                if not error_queue.empty():
-                    error = error_queue.get()
-                    print(f"Error occurred in thread: {error}")
-                    raise error
-
-                self.done_flag.set()
-                if not self.silent: thinking_thread.join()
+    def get_code_summarization(self):
+        # Keep one summarization chain (embedding model and LLM client) warm for every commit
+        if self.code_summary_chain is None:
+            # The langchain / embedding stack is only imported once a summary is requested
+            from commit_analysis import CodeSummarization
+            self.code_summary_chain = CodeSummarization(self.GitRepoManager)
+            self.code_summary_chain.simulate = self.simulate
+        return self.code_summary_chain
 
+    def code_summary(self, prepared):
+        if self.simulate:
+            import lorem # Used for testing
+            return lorem.paragraph()
+        return self.get_code_summarization().summarize_prepared(prepared)
 
-            return self.result_queue.get()
-        
-        except ValueError as e:
-            raise e
+    def prepare_commit(self, commit):
+        # Git extraction and embedding for a commit, run ahead of the LLM calls in batch mode
+        return self.prepare_commits([commit])[0]
 
-    def code_summary(self, commit, codetext):
+    def prepare_commits(self, commits):
+        # Embeds the chunks of all given commits together, see CodeSummarization.prepare_code_diffs
+        if self.simulate:
+            return [None] * len(commits)
+        commit_diffs = []
+        for commit in commits:
+            with tracer.commit_scope(commit.hexsha):
+                commit_diffs.append((commit.hexsha, self.GitRepoManager.stream_changes(commit, self.clean)))
+        return self.get_code_summarization().prepare_code_diffs(commit_diffs)
+
+    def prepare_window(self, commits, futures):
+        # Resolves one future per commit, so the batch loop can wait on each commit separately.
+        # When the window fails as a whole, its commits are prepared again one at a time, so
+        # only the commit at fault fails.
         try:
-            code_summary_chain = CodeSummarization()
-            code_summary_chain.simulate = self.simulate
-            code_summary = code_summary_chain.get_code_summary(commit,codetext)
-            self.result_queue.put(code_summary)
-        except ValueError as e:
-            raise e
-
-    def compare_commit_messages(self, original_commit_msg, generated_commit_msg):
+            results = self.prepare_commits(commits)
+        except Exception as e:
+            if len(commits) == 1:
+                futures[0].set_exception(e)
+                return
+            logging.warning(f"Preparing {len(commits)} commits together failed ({e}), retrying them one at a time")
+            for commit, future in zip(commits, futures):
+                try:
+                    future.set_result(self.prepare_commit(commit))
+                except Exception as commit_error:
+                    future.set_exception(commit_error)
+            return
+
+        for future, prepared in zip(futures, results):
+            future.set_result(prepared)
+
+    def stream_summary(self, prepared):
+        # Show per-file summaries as they complete and the final message token by token.
+        # In silent mode only the message itself is written to stdout.
+        start = time.perf_counter()
         if self.simulate:
-            result = -1
-        else:    
-            result = CommitMsgComparison.compare_messages(original_commit_msg,generated_commit_msg)
-        self.result_queue.put(result)
+            import lorem # Used for testing
+            generated_commit_message = lorem.paragraph()
+            self.print_token(generated_commit_message)
+        else:
+            code_summary_chain = self.get_code_summarization()
+            code_summary_chain.on_file_summary = None if self.silent else self.print_file_summary
+            code_summary_chain.on_token = self.print_token
+            self.streamed_header = False
+            generated_commit_message = code_summary_chain.summarize_prepared(prepared)
+
+        self.console.print(markup=False, highlight=False)
+        if not self.silent and not self.simulate:
+            ttft = self.code_summary_chain.stream_stats.get("ttft_seconds")
+            if ttft is not None:
+                self.console.print(f"\n[white]Time to first token: {ttft:.2f}s, total: {time.perf_counter() - start:.2f}s[/white]")
+        return generated_commit_message
+
+    def print_file_summary(self, file, summary):
+        self.console.print(f"[cyan]{file}[/cyan]")
+        self.console.print(summary, markup=False, highlight=False)
+        self.console.print()
+
+    def print_token(self, token):
+        if not self.streamed_header and not self.silent:
+            self.console.print(self.summary_banner())
+            self.streamed_header = True
+        self.console.print(token, end="", markup=False, highlight=False, soft_wrap=True)
+
+    def summary_banner(self):
+        small_banner_begin = "\n:black_large_square::brown_square::red_square::orange_square::yellow_square::green_square::blue_square::purple_square::white_large_square: "
+        small_banner_end = " :white_large_square::purple_square::blue_square::green_square::yellow_square::orange_square::red_square::brown_square::black_large_square:\n"
+        return small_banner_begin + "Ai Generated Commit Message" + small_banner_end
+
+    def load_judge(self):
+        if not self.simulate:
+            from commit_analysis import CommitMsgComparison
+            CommitMsgComparison.load()
+
+    def compare_commit_messages(self, original_commit_msg, generated_commit_msg, judge=None):
+        if self.simulate:
+            return -1
+        from commit_analysis import CommitMsgComparison
+        return CommitMsgComparison.compare_messages(original_commit_msg,generated_commit_msg)
 
     def validate_commit_message(self, UseCommitMessage):
         return UseCommitMessage in self.VALID_RESPONSES
 
-    def process_commit_data(self, commit, codetext):
-        try:
-            target_function = self.code_summary
-            generated_commit_message = self.thinking_threaded(target_function, [commit.hexsha, codetext], "Generating summary...")
+    def run_pipeline(self, commit, prepared=None):
+        # Extraction, summary and comparison of one commit as a stage pipeline. The original
+        # message is read and the judge's models are loaded while the summary is written.
+        display = StageProgress(self.console, self.STAGE_LABELS) if not self.silent and not self.stream else None
+        with tracer.commit_scope(commit.hexsha), display or contextlib.nullcontext():
+            pipeline = StagePipeline(self.executor, display)
+
+            if prepared is not None:
+                pipeline.adopt("prepare", prepared)
+            else:
+                pipeline.add("prepare", lambda: self.prepare_commit(commit))
+            pipeline.add("summarize", self.summarize_stage(display), "prepare")
+
+            if self.compare_commits_arg:
+                pipeline.add("original_message", lambda: self.GitRepoManager.get_commit_message(commit.hexsha))
+                pipeline.add("judge", self.load_judge)
+                pipeline.add("compare", self.compare_commit_messages, "original_message", "summarize", "judge")
+
+            try:
+                return {name: pipeline.result(name) for name in ("original_message", "summarize", "compare") if name in pipeline.futures}
+            finally:
+                pipeline.wait()
+                pipeline.log_timings()
+
+    def summarize_stage(self, display):
+        def summarize(prepared):
+            if self.stream:
+                generated_commit_message = self.stream_summary(prepared)
+            else:
+                if not self.simulate:
+                    self.get_code_summarization().on_file_summary = display.file_done if display else None
+                    if display is not None:
+                        display.set_total("summarize", len(prepared["files"]))
+                generated_commit_message = self.code_summary(prepared)
+
             if not generated_commit_message:
                 raise ValueError("The generated commit message is empty.")
-          
-            if self.compare_commits_arg:
-                original_commit_msg = commit.message
+            return generated_commit_message
+        return summarize
+
+    def process_commit_data(self, commit, prepared=None):
+        # Returns the exit status; the outcome of the check itself is kept in last_passed,
+        # since --nobreak exits with 0 when a comparison fails
+        self.last_confidence = None
+        self.last_passed = False
+        try:
+            results = self.run_pipeline(commit, prepared)
+            generated_commit_message = results["summarize"]
 
-                target_function = self.compare_commit_messages
-                commit_similarity_confidence = self.thinking_threaded(target_function, [original_commit_msg, generated_commit_message], "Comparing commit messages...")
+            if self.compare_commits_arg:
+                original_commit_msg = results["original_message"]
+                commit_similarity_confidence = results["compare"]
+                self.last_confidence = commit_similarity_confidence
 
                 self.console.print(f"\n[green]Inference Confidence Level: [/green][white] {commit_similarity_confidence}%[/white]")                           
                 if commit_similarity_confidence >= self.confidence_level:
                     self.console.print("\n[green]:green_circle: Commit Message Check Passed[/green]")
-                    sys.exit(0)
+                    self.last_passed = True
+                    return 0
                 else:            
                     self.console.print("\n[red]:red_circle: Commit Message Check Failed[/red]\n")
                     self.output_table(original_commit_msg,generated_commit_message)
+            elif self.stream:
+                # The message has already been streamed to the console
+                self.last_passed = True
+                return 0
             else:
-                small_banner_begin = "\n:black_large_square::brown_square::red_square::orange_square::yellow_square::green_square::blue_square::purple_square::white_large_square: "
-                small_banner_end = " :white_large_square::purple_square::blue_square::green_square::yellow_square::orange_square::red_square::brown_square::black_large_square:\n"
-                table_banner = (small_banner_begin + "Ai Generated Commit Message" + small_banner_end) 
+                table_banner = self.summary_banner()
 
                 table = Table(title = None if self.silent else table_banner,  width=80, border_style="white", box=None, show_header=False)
                 table.add_row(f"[white]{generated_commit_message}[/white]\n")
                 self.console.print(table)
-                sys.exit(0)
+                self.last_passed = True
+                return 0
 
         except ValueError as e:
             self.console.print(f"\n\n[red]:police_car_light: An error occurred:[/red][white] {e}[/white]")
@@ -164,28 +236,92 @@ class CommitProcessor:
         else:
             # If no break is on, exit gracefully
             if self.nobreak:
-                sys.exit(0)
+                return 0
 
-        # Default message and exit
-        self.console.print(":stop_sign: Exiting with status code 1.")
-        sys.exit(1)     
+        return 1
 
     def process_current_repo(self):
         commits = self.GitRepoManager.get_commits()
-        for commit in commits:
-            self.process_single_commit(commit)
+        if self.batch:
+            return self.process_batch(commits)
+        if commits:
+            return self.process_single_commit(commits[0])
+        return 0
 
     def process_single_commit(self, commit):
         if not self.silent:
             print(f"Current Commit: {commit.hexsha}\n")
-        raw_diff = self.GitRepoManager.get_changes(commit)
-        self.process_commit_data(commit, self.clean(raw_diff))
+        return self.process_commit_data(commit)
+
+    def process_batch(self, commits):
+        # Process every commit of the range in this process. While the LLM works on one
+        # window of commits, the next window is extracted and embedded in the background;
+        # the chunks of a whole window go to the embedding model together. Only one window
+        # is prepared ahead, so prepared commits do not pile up in memory.
+        window = max(1, int(os.getenv("EMBEDDING_COMMIT_WINDOW", "4")))
+        futures = [Future() for _ in commits]
+        results = []
+        with ThreadPoolExecutor(max_workers=1) as prefetcher:
+            for index, commit in enumerate(commits):
+                if index == 0:
+                    prefetcher.submit(self.prepare_window, commits[:window], futures[:window])
+                if index % window == 0 and index + window < len(commits):
+                    # This window is now with the summarizer, start preparing the next one
+                    upcoming = slice(index + window, index + 2 * window)
+                    prefetcher.submit(self.prepare_window, commits[upcoming], futures[upcoming])
+
+                if not self.silent:
+                    print(f"Current Commit: {commit.hexsha}\n")
+                prepared, futures[index] = futures[index], None
+                status = self.process_commit_data(commit, prepared=prepared)
+                results.append((commit, self.last_confidence, self.last_passed, status))
+
+        if not self.silent:
+            self.output_batch_report(results)
+        return 1 if any(status for _, _, _, status in results) else 0
+
+    def output_batch_report(self, results):
+        table = Table(title="\nBatch Report", header_style="bold magenta", border_style="white", box=box.HORIZONTALS, width=80)
+        table.add_column("Commit", width=10)
+        table.add_column("Message", width=40, no_wrap=True)
+        table.add_column("Confidence", justify="right", width=10)
+        table.add_column("Result", width=6)
+
+        for commit, confidence, passed, _ in results:
+            summary_line = commit.message.strip().splitlines()[0] if commit.message.strip() else ""
+            confidence_text = "-" if confidence is None else f"{confidence}%"
+            result_text = "[green]PASS[/green]" if passed else "[red]FAIL[/red]"
+            table.add_row(commit.hexsha[:8], summary_line, confidence_text, result_text)
+
+        self.console.print(table)
+        passed = sum(1 for _, _, passed, _ in results if passed)
+        self.console.print(f"[white]{passed} of {len(results)} commits passed.[/white]\n")
 
     def clean(self, raw_diff):
         return Utility.cleanTripleSlashes(
             Utility.cleanTripleQuotes(raw_diff)
         )
 
+    def output_run_stats(self):
+        # Only summaries load the model stack, so there is nothing to report otherwise
+        if self.code_summary_chain is None:
+            return
+
+        from model_registry import ModelRegistry
+        llm_cache = ModelRegistry.stats()["llm_cache"]
+        if llm_cache and (llm_cache["hits"] + llm_cache["misses"]):
+            lookups = llm_cache["hits"] + llm_cache["misses"]
+            self.console.print(f"[white]LLM cache: {llm_cache['hits']} of {lookups} calls served from cache ({llm_cache['hit_rate']:.0%}), ~{llm_cache['saved_tokens']} tokens saved[/white]\n")
+
+        triage = self.code_summary_chain.triage.stats() if self.code_summary_chain.triage is not None else None
+        if triage and triage["files_skipped"]:
+            self.console.print(f"[white]Triage: {triage['files_skipped']} files described without the LLM, {triage['bytes_saved'] / 1024:.0f} KB not embedded or sent[/white]\n")
+
+        from commit_analysis import CommitMsgComparison
+        decided_by = CommitMsgComparison.stats()["decided_by"]
+        if sum(decided_by.values()):
+            self.console.print(f"[white]Comparisons: {decided_by['similarity_pass']} passed and {decided_by['similarity_fail']} failed on similarity, {decided_by['llm']} sent to the LLM judge[/white]\n")
+
     def show_banner(self):
         if self.URI:
             style="bold white on blue"
@@ -228,35 +364,71 @@ class CommitProcessor:
         self.console.print(banner)
 
 
-    def parse_arguments(self):
+    @staticmethod
+    def parse_arguments():
         parser = argparse.ArgumentParser(description="CheekyAI - Create / Validate commit messages.")
         group = parser.add_mutually_exclusive_group()
         group.add_argument("--compare",action="store_true", help="Compare the current commit message to the generated one.")
         group.add_argument("--silent",action="store_true", help="Do not show banners and output only the suggested message. Not compatible with --compare.")
         parser.add_argument("--commit", help="Specify a commit hash to process.")
         parser.add_argument("--nobreak",action="store_true", help="When used with compare, CheekyAi won't exit with an error code if the comparison fails.")
+        parser.add_argument("--stream",action="store_true", help="Show per-file summaries as they complete and stream the generated message as it is written.")
+        parser.add_argument("--serve",action="store_true", help="Run as a local HTTP service with warm models; use cheekyAI_client.py to send requests.")
+        parser.add_argument("--batch",action="store_true", help="Process every commit between the main branch and the current branch, then report and exit once.")
+        parser.add_argument("--trace", metavar="FILE", help="Write a JSON performance report with per-commit stage times, tokens, git bytes and cache hits to FILE.")
+        parser.add_argument("--chrome-trace", metavar="FILE", help="Write the traced spans to FILE in Chrome trace format, for chrome://tracing or Perfetto.")
         # Used for testing
         parser.add_argument("--simulate",action="store_true", help=argparse.SUPPRESS)
         return parser.parse_args()
 
+    STAGE_LABELS = {
+        "prepare": "Extracting changes...",
+        "summarize": "Summarizing files...",
+        "overall": "Writing commit message...",
+        "compare": "Comparing commit messages...",
+    }
+
     compare_commits_arg = False
+    batch = False
+    stream = False
+    streamed_header = False
 
-    def run(self):
-        args = self.parse_arguments()
+    def run(self, args=None):
+        args = args or self.parse_arguments()
         self.silent = bool(args.silent)
         self.compare_commits_arg = bool(args.compare)
         self.nobreak = bool(args.nobreak)
         self.simulate = bool(args.simulate)
+        self.batch = bool(args.batch)
+        self.stream = bool(args.stream)
+        if args.trace or args.chrome_trace:
+            tracer.enable()
 
         if not self.silent: self.show_banner()      
 
+        if args.serve:
+            from server import serve
+            serve(self.console)
+            tracer.write(args.trace, args.chrome_trace)
+            return
+
         if args.commit:
             commit = self.GitRepoManager.get_commit(args.commit)
-            self.process_single_commit(commit)    
+            status = self.process_single_commit(commit)    
         else:
-            self.process_current_repo()
+            status = self.process_current_repo()
+
+        if not self.silent: self.output_run_stats()
+        tracer.write(args.trace, args.chrome_trace)
+
+        if status:
+            # Default message and exit
+            self.console.print(":stop_sign: Exiting with status code 1.")
+        sys.exit(status)
 
 
 if __name__ == "__main__":
+    # Parse arguments first so --help returns before any repository is opened
+    arguments = CommitProcessor.parse_arguments()
     processor = CommitProcessor()
-    processor.run()
+    processor.run(arguments)
@@ -0,0 +1,55 @@
+import os
+import sys
+import json
+import argparse
+import urllib.error
+import urllib.request
+
+# Thin client for a running `cheekyAI.py --serve`. It only uses the standard library, so a
+# git hook calling it starts instantly while the server keeps the models warm.
+
+DEFAULT_URL = os.getenv("CHEEKYAI_URL", "http://127.0.0.1:8642")
+
+
+def request(url, endpoint, payload, timeout):
+    data = json.dumps(payload).encode("utf-8")
+    req = urllib.request.Request(url.rstrip("/") + endpoint, data=data, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=timeout) as response:
+        return json.load(response)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CheekyAI client - ask a running CheekyAI server to summarize or check a commit.")
+    parser.add_argument("--commit", default="HEAD", help="Commit to process (default HEAD).")
+    parser.add_argument("--repo", default=os.getenv("DEVPATH") or os.getcwd(), help="Repository path, as configured on the server (default DEVPATH or the current directory).")
+    parser.add_argument("--compare", action="store_true", help="Compare the commit message to the generated one.")
+    parser.add_argument("--message", help="Commit message to compare instead of the one stored in the commit.")
+    parser.add_argument("--nobreak", action="store_true", help="Do not exit with an error code if the comparison fails.")
+    parser.add_argument("--url", default=DEFAULT_URL, help=f"Server URL (default {DEFAULT_URL}).")
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds to wait for the server.")
+    args = parser.parse_args()
+
+    payload = {"repo": os.path.realpath(args.repo), "commit": args.commit}
+    if args.message:
+        payload["message"] = args.message
+
+    try:
+        result = request(args.url, "/compare" if args.compare else "/summarize", payload, args.timeout)
+    except urllib.error.HTTPError as e:
+        error = json.loads(e.read() or b"{}").get("error", e.reason)
+        print(f"CheekyAI server error: {error}", file=sys.stderr)
+        sys.exit(1)
+    except (urllib.error.URLError, OSError) as e:
+        print(f"CheekyAI server not reachable at {args.url}: {e}", file=sys.stderr)
+        sys.exit(2)
+
+    print(result["message"])
+    if args.compare:
+        status = "Passed" if result["passed"] else "Failed"
+        print(f"\nInference Confidence Level: {result['confidence']}% - Commit Message Check {status}", file=sys.stderr)
+        if not result["passed"] and not args.nobreak:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,36 @@
+import hashlib
 import logging
 import os
+import threading
+import time
+import uuid
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 import lorem # Used for testing
+import numpy as np
 
 # Langchain imports
 from langchain.schema import StrOutputParser
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import Chroma
-from chromadb.config import Settings as ChromaSettings
 from langchain.prompts import (
     ChatPromptTemplate,
     PromptTemplate,
     SystemMessagePromptTemplate
 )
-from langchain.embeddings.sentence_transformer import SentenceTransformerEmbeddings
 from langchain.docstore.document import Document
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
 
 # Local application imports
 from utility import Utility
-from git_repo_manager import GitRepoManager
+from git_repo_manager import DiffSpool, GitRepoManager
+from embedding_cache import CachedEmbeddings
+from model_registry import ModelRegistry
+from context_extractor import ContextExtractor
+from vector_index import NumpyVectorIndex
+from repo_index import RepoIndex
+from file_triage import FileTriage
+from tracing import traced, tracer
 
 
 # Configure logging
@@ -34,69 +44,283 @@ if langchain_verbosity:
     set_debug(True)      
 
 
+class PendingChunks:
+    # Split chunks of one or more commits, waiting to be embedded so the encoder works on full,
+    # deduplicated batches of each commit. Once their text and vectors would take more than max_bytes
+    # they are embedded and added to the vector store of their commit, so the chunks of a large
+    # commit are never all held at once.
+
+    def __init__(self, summarization, max_bytes, dimensions):
+        self.summarization = summarization
+        self.max_bytes = max_bytes
+        # An embedding is a list of Python floats until it is indexed: a pointer and a float object per value
+        self.vector_bytes = dimensions * 32
+        self.entries = []  # (commit, chunks, group) per document
+        self.size = 0
+        self.vectorstores = {}
+
+    def add(self, commit, groups, chunks=None):
+        # groups are (content_key, [chunk texts]) per document; chunks, when given, are the
+        # documents of those texts in the same order and go into the commit's vector store
+        offset = 0
+        for content_key, texts in groups:
+            document_chunks = chunks[offset:offset + len(texts)] if chunks else []
+            offset += len(texts)
+            self.entries.append((commit, document_chunks, (content_key, texts)))
+            self.size += sum(len(text) for text in texts) + len(texts) * self.vector_bytes
+            if self.size >= self.max_bytes:
+                self.flush()
+
+    def flush(self):
+        summarization = self.summarization
+        commit_groups = defaultdict(list)
+        commit_chunks = defaultdict(list)
+        for commit, chunks, group in self.entries:
+            commit_groups[commit].append(group)
+            commit_chunks[commit].extend(chunks)
+
+        # Each commit is embedded in its own scope so spans, chunk counts and cache hits are
+        # traced against it; documents already embedded for an earlier one come from the
+        # embedding cache when it is enabled
+        for commit, groups in commit_groups.items():
+            with tracer.commit_scope(commit):
+                summarization.embed_groups(groups)
+        if summarization.repo_index is not None:
+            summarization.repo_index.store(summarization.embedding_function)
+
+        for commit, chunks in commit_chunks.items():
+            with tracer.commit_scope(commit):
+                self.vectorstores[commit] = summarization.build_index(chunks, self.vectorstores.get(commit))
+
+        summarization.embedding_function.clear()
+        self.entries = []
+        self.size = 0
+
+    def close(self):
+        for vectorstore in self.vectorstores.values():
+            if vectorstore is not None:
+                vectorstore.delete_collection()
+        self.vectorstores = {}
+
+
 class CodeSummarization:
 
     # Used for Testing
     simulate = False
 
-    def __init__(self):
+    # Optional streaming callbacks: on_file_summary(file, summary) as each file completes,
+    # on_token(text) for every chunk of the overall summary
+    on_file_summary = None
+    on_token = None
+    stream_stats = {}
+
+    CHUNK_SIZE = 2000
+    CHUNK_OVERLAP = 100
+
+    def __init__(self, git_repo_manager=None):
         # Load environment variables
-        self.dev_dir = os.getenv("DEVPATH", ".")
+        self.git_repo_manager = git_repo_manager or GitRepoManager()
+        self.dev_dir = self.git_repo_manager.path or "."
+        self.max_concurrency = max(1, int(os.getenv("MAX_CONCURRENCY", "4")))
+        # Files whose content and diff fit in this many tokens skip the vector store
+        self.rag_token_threshold = int(os.getenv("RAG_TOKEN_THRESHOLD", "4000"))
+        self.file_stats = []
+        self.token_stats = {}
+        # Context window of the model, used to plan how per-file summaries are combined
+        self.context_tokens = int(os.getenv("MODEL_CONTEXT_TOKENS", "4096"))
+        # Embed only the changed regions of a file instead of the whole file
+        self.context_extractor = ContextExtractor() if os.getenv("CONTEXT_WINDOWING", "True").lower() == "true" else None
+        # Vector store for retrieval: the built-in NumPy index or chroma
+        self.vector_store = os.getenv("VECTOR_STORE", "numpy").lower()
+        # Of COMMIT_MEMORY_MB, half is for a batch of file contents (see iter_raw_file_contents),
+        # a quarter for chunks waiting to be embedded and a quarter for each commit's NumPy index
+        self.pending_chunk_bytes = self.git_repo_manager.commit_memory_bytes // 4
+        self.index_memory_bytes = self.git_repo_manager.commit_memory_bytes // 4
         
-        # Load embedding_function once
-        self.model_name = "sentence-transformers/all-mpnet-base-v2"
-        self.embedding_function = SentenceTransformerEmbeddings(model_name=self.model_name)
+        # Shared embedding_function, loaded once per process
+        self.model_name = ModelRegistry.embedding_model()
+        self.embedding_function = ModelRegistry.get_embeddings(self.model_name)
+
+        # Reuse embeddings of unchanged blobs across runs, and batch new ones through the shared scheduler
+        if os.getenv("EMBEDDING_CACHE", "True").lower() == "true":
+            self.embedding_cache = ModelRegistry.get_embedding_cache()
+        else:
+            self.embedding_cache = None
+        self.embedding_function = CachedEmbeddings(
+            self.embedding_function, self.embedding_cache, self.model_name, ModelRegistry.get_embedding_scheduler(self.model_name)
+        )
+
+        # Lockfiles, generated and vendored code and the like get a fixed description instead of a summary
+        self.triage = FileTriage(self.git_repo_manager) if os.getenv("TRIAGE", "True").lower() == "true" else None
+
+        # Persistent per-repository index, for related context from files a commit does not touch
+        if os.getenv("REPO_INDEX", "False").lower() == "true":
+            self.repo_index = RepoIndex(self.git_repo_manager, self.model_name, self.CHUNK_SIZE, self.CHUNK_OVERLAP)
+        else:
+            self.repo_index = None
         
-        # Load LLM once
+        # Shared LLM client, created once per process
         temperature = 0.1
         max_tokens = 512
-        self.llm = Utility.load_LLM(temperature=temperature, max_tokens=max_tokens)
-
-    def get_code_summary(self, commit, code_diff):
-        try:
-            if self.simulate:
-                return lorem.paragraph()
-            summary,all_changes = self.process_code_diff(commit, code_diff)
+        self.max_tokens = max_tokens
+        self.llm = ModelRegistry.get_llm(temperature=temperature, max_tokens=max_tokens)
+
+    def summarize_prepared(self, prepared):
+        # Summary of a commit already run through prepare_code_diff
+        if self.simulate:
+            return lorem.paragraph()
+        with tracer.commit_scope(prepared["commit"]):
+            summary,all_changes = self.summarize_files(prepared)
             return self.format_summary(summary,all_changes)
-        except Exception as e:
-            raise e
-
-            
-    def process_code_diff(self, commit, code_diff):
-
-        try:
-            summary = defaultdict(list)
-
-            # Get list of added/removed files
-            git_repo_manager = GitRepoManager()
-            existing_files, all_changes = git_repo_manager.extract_filenames(code_diff)
-            file_diffs = git_repo_manager.parse_diff_files(code_diff)
 
-            existing_files = sorted(existing_files)
+    def prepare_code_diff(self, commit, code_diff):
+        # Git extraction, loading and indexing; everything before the LLM is called
+        return self.prepare_code_diffs([(commit, code_diff)])[0]
 
-            # Load code files
-            documents = self.load_documents(existing_files, commit, file_diffs)
+    def prepare_code_diffs(self, commit_diffs):
+        # prepare_code_diff for several commits at once. The chunks of all commits are
+        # embedded together, see PendingChunks.
+        if self.simulate:
+            return [None] * len(commit_diffs)
 
-            # Process each file
-            for file in existing_files:
-                results = self.process_file(file, documents)
-                summary[file].append(results)
-
-            return summary,all_changes
-        except Exception as e:
-            raise e
+        pending = PendingChunks(self, self.pending_chunk_bytes, ModelRegistry.embedding_dimensions(self.model_name))
+        plans = []
+        try:
+            for commit, code_diff in commit_diffs:
+                with tracer.commit_scope(commit):
+                    plans.append(self.plan_commit(commit, code_diff, pending))
+            pending.flush()
+        except BaseException:
+            pending.close()
+            raise
+
+        prepared = []
+        for commit, changes, existing_files, all_changes, contexts, triaged in plans:
+            with tracer.commit_scope(commit):
+                related = self.repo_index.related(commit, changes, existing_files) if self.repo_index is not None else {}
+            prepared.append({"commit": commit, "files": existing_files, "changes": all_changes, "vectorstore": pending.vectorstores.get(commit), "contexts": contexts, "related": related, "triaged": triaged})
+        return prepared
+
+    def plan_commit(self, commit, code_diff, pending):
+        # code_diff is the diff as a string, or a DiffSpool from GitRepoManager.stream_changes.
+        # The chunks to embed are handed to pending a batch at a time.
+        try:
+            # Get list of added/removed files from git's own change records
+            changes = self.git_repo_manager.get_change_set(commit)
+            existing_files, all_changes = self.git_repo_manager.describe_changes(changes)
+            if isinstance(code_diff, DiffSpool):
+                diff_files = {diff_file.path: diff_file for diff_file in code_diff.files}
+            else:
+                diff_files = {diff_file.path: diff_file for diff_file in self.git_repo_manager.iter_diff_files(code_diff)}
+
+            triaged = self.triage.triage(changes, existing_files, diff_files) if self.triage is not None else {}
+            existing_files = sorted(existing_files - triaged.keys())
+
+            # Load code files a batch at a time, so only one batch of full file contents is held;
+            # small files go straight into the prompt, only large ones are retrieved from the index
+            contexts = {}
+            for files, raw_files in self.git_repo_manager.iter_raw_file_contents(commit, existing_files):
+                contexts.update(self.plan_batch(commit, files, diff_files, raw_files, pending))
+        finally:
+            if isinstance(code_diff, DiffSpool):
+                code_diff.close()
+
+        if self.repo_index is not None:
+            pending.add(commit, self.repo_index.stage(commit, [change for change in changes if change.path not in triaged]))
+        return commit, changes, existing_files, all_changes, contexts, triaged
+
+    def plan_batch(self, commit, files, diff_files, raw_files, pending):
+        # One batch of plan_commit, in its own frame so its documents are freed before the next
+        # batch is read. Returns the direct contexts; the chunks to embed go to pending.
+        start = time.perf_counter()
+        documents = self.load_documents(files, commit, diff_files, raw_files)
+        logging.info("Loaded %d documents in %.2fs", len(documents), time.perf_counter() - start)
+
+        contexts, rag_documents = self.plan_retrieval(files, documents)
+        documents = None  # only the documents to index are still needed
+        self.split_documents(commit, rag_documents, pending)
+        return contexts
+
+    def plan_retrieval(self, existing_files, documents):
+        # Returns {file: (strategy, tokens, direct context or None)} and the documents that need indexing
+        documents_by_source = defaultdict(list)
+        for document in documents:
+            documents_by_source[document.metadata["source"]].append(document)
+
+        contexts = {}
+        rag_documents = []
+        for file in existing_files:
+            file_documents = documents_by_source[self.dev_dir + f"/{file}"]
+            tokens = sum(Utility.count_tokens(document.page_content) for document in file_documents)
+            if tokens <= self.rag_token_threshold:
+                contexts[file] = ("direct", tokens, self.format_docs(file_documents))
+            else:
+                contexts[file] = ("rag", tokens, None)
+                rag_documents.extend(file_documents)
+
+        direct_count = sum(1 for strategy, _, _ in contexts.values() if strategy == "direct")
+        logging.info("Retrieval plan: %d files direct, %d files via RAG (threshold %d tokens)",
+                     direct_count, len(contexts) - direct_count, self.rag_token_threshold)
+        return contexts, rag_documents
+
+    def summarize_files(self, prepared):
+        summary = defaultdict(list)
+        existing_files = prepared["files"]
+        vectorstore = prepared["vectorstore"]
+        contexts = prepared["contexts"]
+        self.file_stats = []
+
+        # Process the files concurrently, collecting results in sorted order
+        try:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                futures = {
+                    executor.submit(tracer.bind(self.process_file), file, vectorstore, contexts[file], prepared["related"].get(file))
+                    : file for file in existing_files
+                }
+                if self.on_file_summary is not None:
+                    for future in as_completed(futures):
+                        self.on_file_summary(futures[future], future.result())
+                results = {file: future.result() for future, file in futures.items()}
+            # Triaged files keep their fixed description, in file order with the summarized ones
+            results.update(prepared["triaged"])
+            for file in sorted(results):
+                summary[file].append(results[file])
+            logging.info("Summarized %d files in %.2fs (max concurrency %d)", len(existing_files), time.perf_counter() - start, self.max_concurrency)
+        finally:
+            if vectorstore is not None:
+                vectorstore.delete_collection()
+
+        return summary,prepared["changes"]
     
-    def load_documents(self, existing_files, commit, file_diffs):
+    @traced("load_documents")
+    def load_documents(self, existing_files, commit, diff_files, raw_files=None):
 
         try:
             documents = []
-            git_repo_manager = GitRepoManager()
+            if raw_files is None:
+                raw_files = self.git_repo_manager.get_raw_file_contents(commit, existing_files)
             for file in existing_files:
-                git_file_raw = git_repo_manager.get_raw_file_content(commit, file)
-                file_diff = file_diffs[file]
-                doc_raw = Document(page_content=git_file_raw, metadata={"source": self.dev_dir + f"/{file}"})
-                doc_diff = Document(page_content=file_diff, metadata={"source": self.dev_dir + f"/{file}"})
-                documents.extend([doc_raw, doc_diff])
+                # Popped, so each full content can be freed once its excerpt is taken
+                blob_sha, git_file_raw = raw_files.pop(file, (None, None))
+                diff_file = diff_files.get(file)
+                if diff_file is None:
+                    logging.warning(f"No diff section found for {file}")
+                file_diff = diff_file.read_text() if diff_file is not None else ''
+                diff_sha = hashlib.sha1(file_diff.encode("utf-8")).hexdigest()
+                if git_file_raw is not None:
+                    content_key = f"blob:{blob_sha}"
+                    if self.context_extractor is not None and diff_file is not None:
+                        git_file_raw, ranges_key = self.context_extractor.extract(file, git_file_raw, diff_file.hunks)
+                        if ranges_key:
+                            content_key += f":lines:{ranges_key}"
+                    doc_raw = Document(page_content=git_file_raw, metadata={"source": self.dev_dir + f"/{file}", "content_key": content_key})
+                    documents.append(doc_raw)
+                else:
+                    logging.info(f"Skipping raw content of binary or missing file {file}")
+                if file_diff:
+                    doc_diff = Document(page_content=file_diff, metadata={"source": self.dev_dir + f"/{file}", "content_key": f"diff:{diff_sha}"})
+                    documents.append(doc_diff)
             return documents
         except Exception as e:
             raise e
@@ -104,43 +328,214 @@ class CodeSummarization:
     def format_docs(self,docs):
         return "\n\n".join(doc.page_content for doc in docs)
 
-    def process_file(self, file, documents):
+    @traced("split")
+    def split_documents(self, commit, documents, pending):
+        # Hands the chunks of each document to pending, with (content_key, [chunk texts]) for the
+        # embedding cache. The list is emptied as it goes, so a document is freed once it is split.
+        seconds = 0.0
+        document_count = len(documents)
+        chunk_count = 0
+        text_splitter = RecursiveCharacterTextSplitter(chunk_size=self.CHUNK_SIZE, chunk_overlap=self.CHUNK_OVERLAP)
+        documents.reverse()
+        while documents:
+            document = documents.pop()
+            start = time.perf_counter()
+            document_chunks = text_splitter.split_documents([document])
+            seconds += time.perf_counter() - start
+            chunk_count += len(document_chunks)
+            pending.add(commit, [(document.metadata["content_key"], [chunk.page_content for chunk in document_chunks])], document_chunks)
+        tracer.count("split.documents", document_count)
+        tracer.count("split.chunks", chunk_count)
+        logging.info("Split %d documents into %d chunks in %.2fs", document_count, chunk_count, seconds)
+
+    @traced("embed")
+    def embed_groups(self, groups):
+        if not groups:
+            return
+
+        start = time.perf_counter()
+        embedded = self.embedding_function.embed_chunk_groups(groups, self.CHUNK_SIZE, self.CHUNK_OVERLAP)
+        logging.info("Embedded %d of %d chunks in %.2fs (embedding cache: %s)",
+                     embedded, sum(len(texts) for _, texts in groups), time.perf_counter() - start,
+                     self.embedding_cache.stats() if self.embedding_cache is not None else "disabled")
+
+    @traced("index")
+    def build_index(self, chunks, vectorstore=None):
+        # Adds the chunks to vectorstore, or to a new one when there is none yet
+        if not chunks:
+            return vectorstore
+
+        start = time.perf_counter()
+        if vectorstore is not None:
+            vectorstore.add_documents(chunks)
+        elif self.vector_store == "chroma":
+            from langchain_community.vectorstores import Chroma
+            from chromadb.config import Settings as ChromaSettings
+
+            # A unique collection per commit keeps chunks of earlier commits out of the results
+            vectorstore = Chroma.from_documents(
+                chunks,
+                self.embedding_function,
+                collection_name=f"commit-{uuid.uuid4().hex}",
+                client_settings=ChromaSettings(anonymized_telemetry=False)
+            )
+        else:
+            vectorstore = NumpyVectorIndex.from_documents(chunks, self.embedding_function, max_bytes=self.index_memory_bytes)
+        logging.info("Indexed %d chunks in %.2fs", len(chunks), time.perf_counter() - start)
+        return vectorstore
+
+    @traced("summarize_file")
+    def process_file(self, file, vectorstore, context=("rag", None, None), related=None):
         try:
             filepath = self.dev_dir + f"/{file}"
-            text_splitter = RecursiveCharacterTextSplitter(chunk_size=2000, chunk_overlap=100)
-            docs = text_splitter.split_documents(documents)
-
-            vectorstore = Chroma.from_documents(docs, self.embedding_function, client_settings=ChromaSettings(anonymized_telemetry=False))
-            retriever = vectorstore.as_retriever(search_kwargs={"k": 10, "filter": {"source": {"$eq": filepath}}})
+            strategy, tokens, direct_context = context
+            if strategy == "direct":
+                code_diff = RunnableLambda(lambda _: direct_context)
+            else:
+                retriever = vectorstore.as_retriever(search_kwargs={"k": 10, "filter": {"source": {"$eq": filepath}}})
+                code_diff = retriever | self.format_docs
+            if related:
+                code_diff = code_diff | (lambda text: f"{text}\n\nRelated code from unchanged files, for context only:\n{related}")
             reviewer_prompt = self.code_reviewer_prompt()
 
             rag_chain = (
-                {"code_diff": retriever | self.format_docs, "question": RunnablePassthrough()}
+                {"code_diff": code_diff, "question": RunnablePassthrough()}
                 | reviewer_prompt
                 | self.llm
                 | StrOutputParser()
             )
 
             logging.info(f"Processing {filepath}")
-            return rag_chain.invoke("List the main changes made in the code, following the above guidelines.")
+            start = time.perf_counter()
+            result = Utility.invoke_with_backoff(rag_chain, "List the main changes made in the code, following the above guidelines.")
+            elapsed = time.perf_counter() - start
+            self.file_stats.append({"file": file, "strategy": strategy, "tokens": tokens, "seconds": round(elapsed, 3)})
+            tracer.count(f"files.{strategy}")
+            tracer.count("context_tokens", tokens or 0)
+            logging.info("Summarized %s using %s context (%s tokens) in %.2fs", filepath, strategy, tokens, elapsed)
+            return result
         except Exception as e:
             logging.error("Error processing file %s: %s", file, e, exc_info=True)
             return "Error in processing file."
 
 
+    @traced("format_summary")
     def format_summary(self, summary, all_changes):
-        result_string = ""
-        for key in summary:
-            result_string += f"{key}:\n{summary[key][0]}\n\n"
+        sections = [f"{key}:\n{summary[key][0]}\n\n" for key in summary]
+
+        changes = [f"{key} file: {value}" for change in all_changes for key, value in change.items()]
 
-        for change in all_changes:
-                    for key, value in change.items():
-                        result_string += f"{key} file: {value}"
+        # Room left once the prompt and the answer are accounted for. The summaries keep at least
+        # enough of it to be reduced, and the change list is cut short when it needs more.
+        available = self.context_tokens - self.max_tokens - self.overall_prompt_tokens()
+        changes_string = self.fit_changes(changes, available - min(2 * self.max_tokens, available))
+        budget = available - Utility.count_tokens(changes_string)
+        self.token_stats = {"files": len(sections), "map_tokens": sum(Utility.count_tokens(section) for section in sections), "reduce": []}
+        sections = self.reduce_sections(sections, budget)
+
+        result_string = "".join(sections) + changes_string
+        self.token_stats["final_tokens"] = Utility.count_tokens(result_string)
+        logging.info("Summary token plan: %s", self.token_stats)
 
         overall_summary = self.overall_summary(result_string)
 
         return overall_summary
 
+    @staticmethod
+    def fit_changes(changes, budget):
+        # The list of added, removed and renamed files, cut to whole entries that fit in budget tokens
+        changes_string = "".join(changes)
+        if Utility.count_tokens(changes_string) <= budget:
+            return changes_string
+
+        kept = []
+        tokens = 0
+        for change in changes:
+            # Leave room for the note on the omitted entries
+            change_tokens = Utility.count_tokens(change)
+            if tokens + change_tokens > budget - 16:
+                break
+            kept.append(change)
+            tokens += change_tokens
+        omitted = len(changes) - len(kept)
+        logging.info("Change list cut to %d of %d entries to fit %d tokens", len(kept), len(changes), budget)
+        return "".join(kept) + (f"\n... and {omitted} more file changes" if kept else f"{omitted} file changes")
+
+    def overall_prompt_tokens(self):
+        messages = self.overall_summary_prompt().format_messages(input=self.OVERALL_SUMMARY_INPUT, result_text="")
+        return sum(Utility.count_tokens(message.content) for message in messages)
+
+    @staticmethod
+    def plan_batches(sections, budget):
+        # Greedily group consecutive sections into batches of at most budget tokens
+        batches = [[]]
+        batch_tokens = 0
+        for section in sections:
+            tokens = Utility.count_tokens(section)
+            if batches[-1] and batch_tokens + tokens > budget:
+                batches.append([])
+                batch_tokens = 0
+            batches[-1].append(section)
+            batch_tokens += tokens
+        return batches
+
+    @traced("reduce")
+    def reduce_sections(self, sections, budget):
+        # Map-reduce: summarize batches that fit the window in parallel until everything fits in one call
+        level = 0
+        while sum(Utility.count_tokens(section) for section in sections) > budget:
+            batches = self.plan_batches(sections, budget)
+            if len(batches) == len(sections) and len(sections) > 1:
+                # Every section needs a batch of its own, so pair them up to make progress
+                batches = [sections[i:i + 2] for i in range(0, len(sections), 2)]
+
+            level += 1
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                batch_texts = ["".join(batch) for batch in batches]
+                reduced = list(executor.map(self.summarize_batch, [self.truncate(text, budget) for text in batch_texts]))
+
+            sections = [f"{text}\n\n" for text in reduced]
+            self.token_stats["reduce"].append({
+                "level": level,
+                "batches": len(batches),
+                "input_tokens": sum(Utility.count_tokens(text) for text in batch_texts),
+                "output_tokens": sum(Utility.count_tokens(section) for section in sections),
+                "seconds": round(time.perf_counter() - start, 3),
+            })
+
+            if len(sections) == 1:
+                return [self.truncate(sections[0], budget)]
+        return sections
+
+    @staticmethod
+    def truncate(text, budget):
+        # Last resort for a single text that cannot be reduced further
+        if Utility.count_tokens(text) <= budget:
+            return text
+        return text[:max(0, int(len(text) * budget / Utility.count_tokens(text)))]
+
+    def summarize_batch(self, batch_text):
+        chain = self.batch_summary_prompt() | self.llm | StrOutputParser()
+        return Utility.invoke_with_backoff(chain, {"summaries": batch_text})
+
+    @staticmethod
+    def batch_summary_prompt():
+        return ChatPromptTemplate.from_messages([
+            ("system", """
+You condense summaries of code changes. Keep the name of every file and all of its notable additions and removals, drop repetition and minor details.
+Respond in plaintext without markup or additional notes.
+"""),
+            ("user", """
+File summaries:
+
+{summaries}
+
+
+Condense the summaries above, keeping one short entry per file.
+""")
+        ])
+
 
     @staticmethod
     def code_reviewer_prompt():
@@ -185,8 +580,31 @@ Response:
         return prompt
     
 
+    OVERALL_SUMMARY_INPUT = "Based on the file summaries provided, create a commit message for each file. Structure each message as a list of bullet points, clearly stating the changes made. Remember to include both additions and removals, and adhere strictly to the format outlined"
+
+    @traced("overall_summary")
     def overall_summary(self,result):
-        prompt = ChatPromptTemplate.from_messages([
+        chain = self.overall_summary_prompt() | self.llm | StrOutputParser()
+        chain_input = {"input": self.OVERALL_SUMMARY_INPUT,"result_text":result}
+        if self.on_token is None:
+            return chain.invoke(chain_input)
+
+        # Stream the answer, measuring the time to its first token
+        chunks = []
+        start = time.perf_counter()
+        self.stream_stats = {"ttft_seconds": None}
+        for chunk in chain.stream(chain_input):
+            if self.stream_stats["ttft_seconds"] is None:
+                self.stream_stats["ttft_seconds"] = round(time.perf_counter() - start, 3)
+            chunks.append(chunk)
+            self.on_token(chunk)
+        self.stream_stats["stream_seconds"] = round(time.perf_counter() - start, 3)
+        logging.info("Overall summary streamed: %s", self.stream_stats)
+        return "".join(chunks)
+
+    @staticmethod
+    def overall_summary_prompt():
+        return ChatPromptTemplate.from_messages([
             ("system", """
 As a specialist in crafting commit messages, your task is to concisely summarize code modifications. Keep the following guidelines in mind:
 * Start each message with a verb in the imperative mood (e.g., Update, Add, Refactor, Remove).
@@ -208,30 +626,80 @@ Your task is to compose a distinct commit message for each file, summarizing the
 Your responses should be formatted as bullet points for each file, clearly summarizing the changes without markup.
 """)
         ])
-
-        chain = prompt | self.llm | StrOutputParser()
-        return chain.invoke({"input": "Based on the file summaries provided, create a commit message for each file. Structure each message as a list of bullet points, clearly stating the changes made. Remember to include both additions and removals, and adhere strictly to the format outlined","result_text":result})
       
 
 class CommitMsgComparison:
     DEFAULT_TEMPERATURE = 0.1
+    # Which tier decided each comparison: the local embedding similarity or the LLM judge
+    tier_counts = {"similarity_pass": 0, "similarity_fail": 0, "llm": 0}
+    tier_seconds = {"similarity": 0.0, "llm": 0.0}
+    stats_lock = threading.Lock()
 
     @staticmethod
+    @traced("compare")
     def compare_messages(original_commit_msg, generated_commit_msg):
-
+        # Clear matches and mismatches are decided by the cosine similarity of the two messages;
+        # only scores inside the uncertainty band go to the LLM judge
+        if os.getenv("COMPARE_PREFILTER", "True").lower() == "true":
+            fail_below = float(os.getenv("COMPARE_FAIL_SIMILARITY", "0.35"))
+            pass_above = float(os.getenv("COMPARE_PASS_SIMILARITY", "0.80"))
+
+            start = time.perf_counter()
+            similarity = CommitMsgComparison.message_similarity(original_commit_msg, generated_commit_msg)
+            elapsed = time.perf_counter() - start
+            tier = "similarity_pass" if similarity >= pass_above else "similarity_fail" if similarity < fail_below else None
+            CommitMsgComparison.record("similarity", elapsed, tier)
+            logging.info("Commit message similarity %.3f (band %.2f-%.2f) in %.3fs", similarity, fail_below, pass_above, elapsed)
+            if tier is not None:
+                # The tier's decision is final: the score is kept on its side of CONFIDENCE
+                confidence_level = int(os.getenv("CONFIDENCE", "60"))
+                confidence = max(0, round(similarity * 100))
+                return max(confidence, confidence_level) if tier == "similarity_pass" else min(confidence, max(0, confidence_level - 1))
+
+        start = time.perf_counter()
         try:
-            llm = Utility.load_LLM(temperature=CommitMsgComparison.DEFAULT_TEMPERATURE)
+            llm = ModelRegistry.get_llm(temperature=CommitMsgComparison.DEFAULT_TEMPERATURE)
             output_parser = StrOutputParser()
             prompt = CommitMsgComparison.commit_reviewer_prompt()
             chain = prompt | llm | output_parser
             response = chain.invoke({"original_commit_msg": {original_commit_msg}, "generated_commit_msg": {generated_commit_msg}})
             confidence_int = Utility.parse_confidence(response)
+            CommitMsgComparison.record("llm", time.perf_counter() - start, "llm")
             return confidence_int
            
         except Exception as e:
             logging.error(f"Error generating answer: {e}")
             raise ValueError("Error generating answer.") from e
 
+    @staticmethod
+    def load():
+        # Loads the judge's models up front, so it can happen while the summary is written
+        if os.getenv("COMPARE_PREFILTER", "True").lower() == "true":
+            ModelRegistry.get_embeddings()
+        ModelRegistry.get_llm(temperature=CommitMsgComparison.DEFAULT_TEMPERATURE)
+
+    @staticmethod
+    def message_similarity(original_commit_msg, generated_commit_msg):
+        embeddings = ModelRegistry.get_embeddings()
+        original, generated = np.asarray(embeddings.embed_documents([original_commit_msg, generated_commit_msg]), dtype=np.float32)
+        norms = np.linalg.norm(original) * np.linalg.norm(generated)
+        return float(original @ generated / norms) if norms else 0.0
+
+    @staticmethod
+    def record(stage, seconds, tier):
+        with CommitMsgComparison.stats_lock:
+            CommitMsgComparison.tier_seconds[stage] += seconds
+            if tier is not None:
+                CommitMsgComparison.tier_counts[tier] += 1
+        if tier is not None:
+            tracer.count(f"compare.{tier}")
+
+    @staticmethod
+    def stats():
+        with CommitMsgComparison.stats_lock:
+            return {"decided_by": dict(CommitMsgComparison.tier_counts),
+                    "seconds": {stage: round(seconds, 3) for stage, seconds in CommitMsgComparison.tier_seconds.items()}}
+
     @staticmethod
     def commit_reviewer_prompt():
         return ChatPromptTemplate(
@@ -0,0 +1,93 @@
+import ast
+import hashlib
+import logging
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class ContextExtractor:
+    # Cuts a file down to the regions touched by a diff: each hunk's changed lines plus
+    # context_lines around them, widened to the enclosing function or class for Python files.
+
+    def __init__(self, context_lines=None, python_scopes=None, max_scope_lines=None):
+        self.context_lines = context_lines if context_lines is not None else int(os.getenv("CONTEXT_LINES", "20"))
+        self.python_scopes = python_scopes if python_scopes is not None else os.getenv("CONTEXT_PYTHON_SCOPES", "True").lower() == "true"
+        # Scopes longer than this are not pulled in whole
+        self.max_scope_lines = max_scope_lines or int(os.getenv("CONTEXT_MAX_SCOPE_LINES", "200"))
+
+    def extract(self, file_path, content, hunks):
+        # Returns (excerpt, content_key_suffix), or (content, None) when the excerpt would cover most of the file
+        lines = content.splitlines(keepends=True)
+        if not lines or not hunks:
+            return content, None
+
+        ranges = []
+        for _, _, new_start, new_count in hunks:
+            changed_start = max(1, new_start)
+            changed_end = max(changed_start, new_start + new_count - 1)
+            ranges.append((changed_start, changed_end))
+
+        if self.python_scopes and file_path.endswith(".py"):
+            ranges = self.expand_to_scopes(content, ranges)
+
+        ranges = [
+            (max(1, start - self.context_lines), min(len(lines), end + self.context_lines))
+            for start, end in ranges
+        ]
+        ranges = self.merge_ranges(ranges)
+
+        covered = sum(end - start + 1 for start, end in ranges)
+        if covered >= len(lines) * 0.9:
+            return content, None
+
+        parts = []
+        previous_end = 0
+        for start, end in ranges:
+            if start > previous_end + 1:
+                parts.append(f"... lines {previous_end + 1}-{start - 1} unchanged ...\n")
+            parts.append("".join(lines[start - 1:end]))
+            if not parts[-1].endswith("\n"):
+                parts[-1] += "\n"
+            previous_end = end
+        if previous_end < len(lines):
+            parts.append(f"... lines {previous_end + 1}-{len(lines)} unchanged ...\n")
+
+        excerpt = "".join(parts)
+        logging.info(f"Context for {file_path}: {covered} of {len(lines)} lines ({len(excerpt)} of {len(content)} characters)")
+        key_suffix = hashlib.sha1(repr(ranges).encode("utf-8")).hexdigest()[:16]
+        return excerpt, key_suffix
+
+    def expand_to_scopes(self, content, ranges):
+        # Widen each range to the innermost function or class around its first and last line
+        try:
+            tree = ast.parse(content)
+        except (SyntaxError, ValueError):
+            return ranges
+
+        scopes = [
+            (node.lineno, node.end_lineno)
+            for node in ast.walk(tree)
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+            and node.end_lineno - node.lineno < self.max_scope_lines
+        ]
+
+        def innermost(line):
+            enclosing = [scope for scope in scopes if scope[0] <= line <= scope[1]]
+            return min(enclosing, key=lambda scope: scope[1] - scope[0]) if enclosing else (line, line)
+
+        expanded = []
+        for start, end in ranges:
+            expanded.append((min(start, innermost(start)[0]), max(end, innermost(end)[1])))
+        return expanded
+
+    @staticmethod
+    def merge_ranges(ranges):
+        merged = []
+        for start, end in sorted(ranges):
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return merged
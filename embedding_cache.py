@@ -0,0 +1,191 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+
+from tracing import tracer
+
+load_dotenv()
+
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "cheekyai"))
+
+
+class EmbeddingCache:
+    # On-disk, content-addressed store of chunk embeddings with size-bounded LRU eviction.
+    # Entries are keyed by the content key of a document (git blob SHA or diff hash),
+    # the chunking parameters and the embedding model, so any change to those re-embeds.
+
+    def __init__(self, path=None, max_bytes=None):
+        self.path = path or os.path.join(CACHE_DIR, "embeddings.sqlite")
+        self.max_bytes = max_bytes or int(os.getenv("EMBEDDING_CACHE_MB", "512")) * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings "
+            "(key TEXT PRIMARY KEY, dim INTEGER, vectors BLOB, size INTEGER, accessed REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS embeddings_accessed ON embeddings (accessed)")
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(content_key, chunk_size, chunk_overlap, model_name):
+        raw_key = f"{content_key}|{chunk_size}|{chunk_overlap}|{model_name}"
+        return hashlib.sha256(raw_key.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT dim, vectors FROM embeddings WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                tracer.count("embedding_cache.misses")
+                return None
+
+            self.hits += 1
+            tracer.count("embedding_cache.hits")
+            self.conn.execute("UPDATE embeddings SET accessed = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+
+        dim, blob = row
+        flat = array("f")
+        flat.frombytes(blob)
+        return [flat[i:i + dim].tolist() for i in range(0, len(flat), dim)] if dim else []
+
+    def put(self, key, vectors):
+        dim = len(vectors[0]) if vectors else 0
+        flat = array("f")
+        for vector in vectors:
+            flat.extend(vector)
+        blob = flat.tobytes()
+
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO embeddings (key, dim, vectors, size, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, dim, blob, len(blob), time.time())
+            )
+            self.evict()
+            self.conn.commit()
+
+    def evict(self):
+        # Drop least recently used entries until the cache fits in max_bytes. Caller holds the lock.
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        evicted = []
+        for key, size in self.conn.execute("SELECT key, size FROM embeddings ORDER BY accessed"):
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+
+        self.conn.executemany("DELETE FROM embeddings WHERE key = ?", evicted)
+        logging.info("Embedding cache evicted %d entries", len(evicted))
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+        }
+
+
+class EmbeddingScheduler:
+    # Funnels chunk texts from any number of files or commits into the encoder: identical texts
+    # are encoded once and everything pending is sent in a single call, which the model splits
+    # into batches of its configured batch size.
+
+    def __init__(self, embedding_function):
+        self.embedding_function = embedding_function
+        self.lock = threading.Lock()
+        self.requested = 0
+        self.encoded = 0
+        self.seconds = 0.0
+
+    def embed(self, texts):
+        unique_texts = list(dict.fromkeys(texts))
+        if not unique_texts:
+            return []
+
+        with self.lock, tracer.span("embedding.encode", chunks=len(unique_texts)):
+            start = time.perf_counter()
+            vectors = dict(zip(unique_texts, self.embedding_function.embed_documents(unique_texts)))
+            elapsed = time.perf_counter() - start
+
+            self.requested += len(texts)
+            self.encoded += len(unique_texts)
+            self.seconds += elapsed
+
+        tracer.count("embedding.chunks_requested", len(texts))
+        tracer.count("embedding.chunks_encoded", len(unique_texts))
+        logging.info(f"Encoded {len(unique_texts)} unique of {len(texts)} chunks in {elapsed:.2f}s "
+                     f"({len(unique_texts) / elapsed if elapsed else 0:.1f} chunks/s)")
+        return [vectors[text] for text in texts]
+
+    def stats(self):
+        return {
+            "chunks_requested": self.requested,
+            "chunks_encoded": self.encoded,
+            "duplicates_skipped": self.requested - self.encoded,
+            "chunks_per_second": round(self.encoded / self.seconds, 1) if self.seconds else None,
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    # Embedding function that serves chunks of already seen documents from an EmbeddingCache
+    # (when one is given) and sends the rest through an EmbeddingScheduler. embed_chunk_groups()
+    # resolves whole documents up front, after which embed_documents() (as called by the vector
+    # store) only embeds text it has not seen.
+
+    def __init__(self, embedding_function, cache, model_name, scheduler=None):
+        self.embedding_function = embedding_function
+        self.cache = cache
+        self.model_name = model_name
+        self.scheduler = scheduler or EmbeddingScheduler(embedding_function)
+        self.resolved = {}
+
+    def embed_chunk_groups(self, groups, chunk_size, chunk_overlap):
+        # groups is a list of (content_key, [chunk texts]) tuples, one per document
+        pending = []
+        for content_key, texts in groups:
+            key = EmbeddingCache.make_key(content_key, chunk_size, chunk_overlap, self.model_name)
+            vectors = self.cache.get(key) if self.cache is not None else None
+            if vectors is not None and len(vectors) == len(texts):
+                self.resolved.update(zip(texts, vectors))
+            else:
+                pending.append((key, texts))
+
+        # Embed every miss of the given documents in a single scheduled call
+        texts_to_embed = [text for _, texts in pending for text in texts]
+        if texts_to_embed:
+            vectors = self.scheduler.embed(texts_to_embed)
+            offset = 0
+            for key, texts in pending:
+                group_vectors = vectors[offset:offset + len(texts)]
+                offset += len(texts)
+                if self.cache is not None:
+                    self.cache.put(key, group_vectors)
+                self.resolved.update(zip(texts, group_vectors))
+
+        return len(texts_to_embed)
+
+    def embed_documents(self, texts):
+        missing = [text for text in texts if text not in self.resolved]
+        if missing:
+            self.resolved.update(zip(missing, self.scheduler.embed(missing)))
+        return [self.resolved[text] for text in texts]
+
+    def embed_query(self, text):
+        return self.embedding_function.embed_query(text)
+
+    def clear(self):
+        self.resolved.clear()
@@ -0,0 +1,164 @@
+import fnmatch
+import logging
+import os
+import threading
+from collections import Counter
+from dotenv import load_dotenv
+
+from tracing import tracer
+
+load_dotenv()
+
+
+class FileTriage:
+    # Picks the files of a commit that are not worth an embedding and an LLM call: lockfiles,
+    # minified bundles, snapshots, vendored and generated code, files matched by .cheekyignore
+    # and files over the size or line limits. They get a fixed one-line description instead.
+
+    # (reason, gitignore-style patterns), checked in order
+    BUILTIN_PATTERNS = [
+        ("lockfile", [
+            "package-lock.json", "npm-shrinkwrap.json", "yarn.lock", "pnpm-lock.yaml", "bun.lockb",
+            "poetry.lock", "Pipfile.lock", "uv.lock", "pdm.lock", "Cargo.lock", "composer.lock",
+            "Gemfile.lock", "go.sum", "packages.lock.json", "mix.lock", "pubspec.lock", "flake.lock",
+        ]),
+        ("minified file", ["*.min.js", "*.min.css", "*.min.mjs", "*.bundle.js", "*.js.map", "*.css.map"]),
+        ("test snapshot", ["*.snap", "__snapshots__/"]),
+        ("vendored code", ["vendor/", "vendors/", "third_party/", "thirdparty/", "node_modules/", ".yarn/"]),
+        ("generated code", [
+            "*_pb2.py", "*_pb2_grpc.py", "*.pb.go", "*.pb.cc", "*.pb.h", "*.generated.*", "*.g.dart",
+            "*.Designer.cs", "*.designer.cs",
+        ]),
+    ]
+    # Markers tools put in the first lines of generated files, looked for when the diff shows them
+    GENERATED_MARKERS = ("@generated", "DO NOT EDIT", "Code generated by", "auto-generated", "autogenerated")
+    # Changed lines this long on average mean minified or machine-written content
+    MINIFIED_LINE_LENGTH = 500
+
+    def __init__(self, git_repo_manager, ignore_file=None, max_changed_lines=None, max_file_kb=None):
+        self.git_repo_manager = git_repo_manager
+        repo_path = git_repo_manager.repo.working_dir
+        self.ignore_file = ignore_file or os.getenv("TRIAGE_IGNORE_FILE", ".cheekyignore")
+        self.ignore_patterns = self.load_patterns(os.path.join(repo_path, self.ignore_file))
+        self.max_changed_lines = max_changed_lines or int(os.getenv("TRIAGE_MAX_CHANGED_LINES", "3000"))
+        self.max_file_bytes = (max_file_kb or int(os.getenv("TRIAGE_MAX_FILE_KB", "512"))) * 1024
+
+        self.lock = threading.Lock()
+        self.files_skipped = 0
+        self.bytes_saved = 0
+        self.reasons = Counter()
+
+    @staticmethod
+    def load_patterns(path):
+        # Blank lines and # comments are ignored, a leading ! re-includes a path
+        try:
+            with open(path, encoding="utf-8") as file:
+                lines = [line.strip() for line in file]
+        except OSError:
+            return []
+        return [line for line in lines if line and not line.startswith("#")]
+
+    @staticmethod
+    def matches(pattern, path):
+        # gitignore-style: a pattern containing a slash is anchored at the repository root, one
+        # ending in a slash only matches directories, and a matching directory covers its contents
+        if pattern.startswith("**/"):
+            pattern = pattern[3:]
+        directory_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        anchored = "/" in pattern
+        pattern = pattern.lstrip("/")
+
+        parts = path.split("/")
+        if anchored:
+            candidates = ["/".join(parts[:index]) for index in range(1, len(parts))]
+            if not directory_only:
+                candidates.append(path)
+        else:
+            candidates = parts[:-1] if directory_only else parts
+        return any(fnmatch.fnmatchcase(candidate, pattern) for candidate in candidates)
+
+    def ignored(self, path):
+        # The last matching pattern decides, as in .gitignore
+        ignored = False
+        for pattern in self.ignore_patterns:
+            negated = pattern.startswith("!")
+            if self.matches(pattern[1:] if negated else pattern, path):
+                ignored = not negated
+        return ignored
+
+    def reason(self, change, diff_file, size):
+        if self.ignored(change.path):
+            return f"file excluded by {self.ignore_file}"
+        for reason, patterns in self.BUILTIN_PATTERNS:
+            if any(self.matches(pattern, change.path) for pattern in patterns):
+                return reason
+
+        changed_lines = change.additions + change.deletions
+        if changed_lines > self.max_changed_lines:
+            return "large change"
+        if size is not None and size > self.max_file_bytes:
+            return "large file"
+
+        if diff_file is None:
+            return None
+        lines = diff_file.read_text().splitlines()
+        changed = [line for line in lines if line.startswith(("+", "-")) and not line.startswith(("+++", "---"))]
+        if changed and sum(len(line) for line in changed) / len(changed) > self.MINIFIED_LINE_LENGTH:
+            return "minified file"
+        if diff_file.hunks and diff_file.hunks[0][2] <= 1:
+            # The first hunk starts at the top of the new file
+            first_hunk = next(index for index, line in enumerate(lines) if line.startswith("@@"))
+            head = [line for line in lines[first_hunk + 1:first_hunk + 20] if not line.startswith("-")][:10]
+            if any(marker in line for line in head for marker in self.GENERATED_MARKERS):
+                return "generated code"
+        return None
+
+    @staticmethod
+    def format_count(count):
+        if count < 1000:
+            return str(count)
+        return f"{count / 1000:.1f}".rstrip("0").rstrip(".") + "k"
+
+    @classmethod
+    def describe(cls, change, reason):
+        # e.g. "updated lockfile, +3k/-2k lines"
+        action = "added" if change.status in ("added", "copied") else "updated"
+        return f"{action} {reason}, +{cls.format_count(change.additions)}/-{cls.format_count(change.deletions)} lines"
+
+    def triage(self, changes, files, diff_files):
+        # Returns {file: description} for the files that skip summarization
+        candidates = [change for change in changes if change.path in files]
+        sizes = self.git_repo_manager.get_object_sizes([change.new_sha for change in candidates])
+
+        triaged = {}
+        saved = 0
+        reasons = Counter()
+        for change, size in zip(candidates, sizes):
+            diff_file = diff_files.get(change.path)
+            reason = self.reason(change, diff_file, size)
+            if reason is None:
+                continue
+            triaged[change.path] = self.describe(change, reason)
+            reasons[reason] += 1
+            # Neither the file nor its diff is loaded, embedded or sent to the model
+            saved += (size or 0) + (len(diff_file.read_text()) if diff_file is not None else 0)
+
+        if triaged:
+            with self.lock:
+                self.files_skipped += len(triaged)
+                self.bytes_saved += saved
+                self.reasons.update(reasons)
+            tracer.count("triage.files_skipped", len(triaged))
+            tracer.count("triage.bytes_saved", saved)
+            logging.info("Triage: described %d of %d files without the model (%s), %.1f KB not processed",
+                         len(triaged), len(candidates), ", ".join(f"{reason} {count}" for reason, count in reasons.items()), saved / 1024)
+        return triaged
+
+    def stats(self):
+        with self.lock:
+            return {
+                "files_skipped": self.files_skipped,
+                "bytes_saved": self.bytes_saved,
+                "reasons": dict(self.reasons),
+            }
@@ -1,15 +1,226 @@
 import git
 from git import Repo
+import io
 import os
+import subprocess
+import tempfile
+import threading
+from dataclasses import dataclass, field
 from dotenv import load_dotenv
 import re
 import logging
 
+from tracing import traced, tracer
+
+
+@dataclass
+class DiffFile:
+    # One file's section of a unified git diff
+    path: str
+    old_path: str
+    status: str = 'modified'  # added, removed, renamed or modified
+    hunks: list = field(default_factory=list)  # (old_start, old_count, new_start, new_count)
+    binary: bool = False
+    text: str = ''
+    spool: object = field(default=None, repr=False)  # DiffSpool holding the text instead
+    spool_index: int = None
+
+    def read_text(self):
+        if self.spool is not None:
+            return self.spool.read(self.spool_index)
+        return self.text
+
+
+class DiffSpool:
+    # The diff of one commit as returned by GitRepoManager.stream_changes, one section per file.
+    # Sections stay in memory up to max_bytes and are spilled to a temporary file beyond that.
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.file = tempfile.SpooledTemporaryFile(max_size=max_bytes)
+        self.files = []
+        self.sections = []  # (offset, length) per file
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def add(self, diff_file):
+        # Moves the file's text into the spool
+        data = diff_file.text.encode("utf-8")
+        with self.lock:
+            self.file.seek(self.size)
+            self.file.write(data)
+            diff_file.spool_index = len(self.sections)
+            self.sections.append((self.size, len(data)))
+            self.size += len(data)
+        diff_file.text = ''
+        diff_file.spool = self
+        self.files.append(diff_file)
+
+    def read(self, index):
+        offset, length = self.sections[index]
+        with self.lock:
+            self.file.seek(offset)
+            return self.file.read(length).decode("utf-8")
+
+    @property
+    def spilled(self):
+        return self.size > self.max_bytes
+
+    def close(self):
+        self.file.close()
+
+
+@dataclass
+class FileChange:
+    # One entry of `git diff --raw --numstat`, as returned by GitRepoManager.get_change_set
+    status: str  # added, removed, renamed, copied, modified or type_changed
+    path: str
+    old_path: str
+    old_mode: str
+    new_mode: str
+    old_sha: str
+    new_sha: str
+    similarity: int = None  # rename / copy score
+    additions: int = None  # None for binary files
+    deletions: int = None
+
+    GITLINK_MODE = '160000'
+
+    @property
+    def binary(self):
+        return self.additions is None
+
+    @property
+    def mode_only(self):
+        return self.old_sha == self.new_sha and self.old_mode != self.new_mode
+
+    @property
+    def gitlink(self):
+        # Submodule commit pointer, numstat reports it as a one line "Subproject commit" change
+        return self.GITLINK_MODE in (self.old_mode, self.new_mode)
+
+    @property
+    def has_text_changes(self):
+        return not self.binary and not self.gitlink and (self.additions + self.deletions) > 0
+
+
+class BlobReader:
+    # Keeps one long-lived `git cat-file --batch` process per repository. Requests for many
+    # objects are written in one go and the replies read back in order.
+
+    def __init__(self, repo_path):
+        self.repo_path = repo_path
+        self.process = None
+        self.lock = threading.Lock()
+        self.bytes_read = 0
+
+    def _ensure_process(self):
+        if self.process is None or self.process.poll() is not None:
+            self.process = subprocess.Popen(
+                ["git", "cat-file", "--batch"],
+                cwd=self.repo_path,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+            )
+
+    def _write_requests(self, process, requests):
+        try:
+            process.stdin.write(requests)
+            process.stdin.flush()
+        except (BrokenPipeError, ValueError):
+            # The process was killed after a failed read
+            pass
+
+    def _reset(self):
+        # Replies still in the pipe would be taken for the answers to the next request
+        if self.process is not None:
+            self.process.kill()
+            self.process.wait()
+            for pipe in (self.process.stdin, self.process.stdout):
+                try:
+                    pipe.close()
+                except (BrokenPipeError, ValueError):
+                    # Requests the writer had not flushed yet
+                    pass
+        self.process = None
+
+    @staticmethod
+    def parse_header(header):
+        # (sha, type, size) of a `git cat-file --batch(-check)` reply header, or None when the
+        # object is missing. The requested name is echoed back and may contain spaces.
+        header = header.rstrip(b"\n")
+        if header.endswith((b" missing", b" ambiguous")):
+            return None
+        parts = header.split(b" ")
+        if len(parts) != 3 or not re.fullmatch(rb"[0-9a-f]{40,64}", parts[0]) or not parts[2].isdigit():
+            raise git.GitError(f"Unexpected reply from git cat-file: {header[:200]!r}")
+        sha, object_type, size = parts
+        return sha.decode(), object_type.decode(), int(size)
+
+    def read_objects(self, object_names):
+        # Returns a (sha, type, data) tuple per object name, or None for missing objects
+        if not object_names:
+            return []
+
+        with self.lock:
+            self._ensure_process()
+            requests = "".join(f"{name}\n" for name in object_names).encode("utf-8")
+
+            # Write from a separate thread so a full stdout pipe cannot deadlock the request
+            writer = threading.Thread(target=self._write_requests, args=(self.process, requests))
+            writer.start()
+
+            results = []
+            try:
+                for _ in object_names:
+                    header = self.process.stdout.readline()
+                    if not header:
+                        raise git.GitError("git cat-file --batch exited unexpectedly")
+
+                    found = self.parse_header(header)
+                    if found is None:
+                        results.append(None)
+                        continue
+
+                    sha, object_type, size = found
+                    data = self.process.stdout.read(size)
+                    if len(data) != size or self.process.stdout.read(1) != b"\n":
+                        raise git.GitError("git cat-file --batch returned a truncated object")
+                    self.bytes_read += len(data)
+                    results.append((sha, object_type, data))
+            except BaseException:
+                # Killing the process also unblocks the writer
+                self._reset()
+                raise
+            finally:
+                writer.join()
+
+        tracer.count("git.objects_read", len(object_names))
+        tracer.count("git.bytes_read", sum(len(found[2]) for found in results if found is not None))
+        return results
+
+    def close(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.stdin.close()
+            self.process.wait()
+            self.process.stdout.close()
+        self.process = None
+
+
 class GitRepoManager:
-    def __init__(self):
+    DIFF_HEADER = re.compile(r'diff --git a/(.*) b/(.*)')
+    # Paths with non-ASCII or special characters are quoted C-style: "a/caf\303\251.py"
+    QUOTED_PATH = re.compile(r'"(?:[^"\\]|\\.)*"')
+    PATH_ESCAPES = {'a': b'\a', 'b': b'\b', 't': b'\t', 'n': b'\n', 'v': b'\v', 'f': b'\f', 'r': b'\r', '"': b'"', '\\': b'\\'}
+    HUNK_HEADER = re.compile(r'@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+    CHANGE_STATUSES = {'A': 'added', 'D': 'removed', 'R': 'renamed', 'C': 'copied', 'M': 'modified', 'T': 'type_changed'}
+
+    def __init__(self, path=None):
         load_dotenv()
         self.mainbranch = os.getenv("MAINBRANCH")
-        self.path = os.getenv("DEVPATH")
+        self.path = path or os.getenv("DEVPATH")
+        # Diff text and file contents of a commit held in memory at once
+        self.commit_memory_bytes = int(os.getenv("COMMIT_MEMORY_MB", "128")) * 1024 * 1024
         log_level = os.getenv("LOG_LEVEL", "INFO").upper()
         logging.basicConfig(level=log_level)
 
@@ -18,6 +229,8 @@ class GitRepoManager:
         except Exception as e:
           raise Exception(f"Failed to initialize repository at '{self.path}'") from e
 
+        self.blob_reader = BlobReader(self.repo.working_dir)
+
 
     def get_current_branch(self):
         try:
@@ -45,17 +258,153 @@ class GitRepoManager:
             return self.get_commit_list(base_branch, current_branch)
         return []
     
+    @traced("git.diff")
     def get_changes(self, commit):
         try:
             current = self.repo.commit(commit)
             parent = self.get_parent(current)
             if parent:
-                return self.repo.git.diff(parent.hexsha, current.hexsha)
+                diff = self.repo.git.diff(parent.hexsha, current.hexsha)
+                tracer.count("git.diff_bytes", len(diff))
+                return diff
             return ''
         except git.GitCommandError as e:
             logging.error(f"Error getting changes: {e}")
             return ''
     
+    @traced("git.diff")
+    def stream_changes(self, commit, clean=None):
+        # get_changes for large commits: `git diff` is read line by line, each line passed through
+        # clean, and every file's section moved into a DiffSpool as soon as it is complete, so at
+        # most one file's diff is held as a string
+        spool = DiffSpool(self.commit_memory_bytes)
+        try:
+            current = self.repo.commit(commit)
+        except (git.GitCommandError, ValueError) as e:
+            logging.error(f"Error getting changes: {e}")
+            return spool
+        parent = self.get_parent(current)
+        if not parent:
+            return spool
+
+        process = subprocess.Popen(
+            ["git", "diff", "--no-color", parent.hexsha, current.hexsha],
+            cwd=self.repo.working_dir,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        try:
+            lines = io.TextIOWrapper(process.stdout, encoding="utf-8", errors="replace", newline="\n")
+            for diff_file in self.iter_diff_files(map(clean, lines) if clean else lines):
+                spool.add(diff_file)
+        except BaseException:
+            process.kill()
+            spool.close()
+            raise
+        finally:
+            process.stdout.close()
+            error = process.stderr.read().decode("utf-8", errors="replace")
+            process.stderr.close()
+            process.wait()
+
+        if process.returncode:
+            logging.error(f"Error getting changes: {error.strip()}")
+            spool.close()
+            return DiffSpool(self.commit_memory_bytes)
+
+        tracer.count("git.diff_bytes", spool.size)
+        logging.info("Read diff of %d files (%.1f KB%s)", len(spool.files), spool.size / 1024, ", spilled to disk" if spool.spilled else "")
+        return spool
+
+    @traced("git.change_set")
+    def get_change_set(self, commit):
+        # Typed change records for a commit, straight from git's rename-aware raw and numstat output
+        try:
+            current = self.repo.commit(commit)
+            parent = self.get_parent(current)
+            if parent:
+                output = self.repo.git.diff(parent.hexsha, current.hexsha, '--raw', '--numstat', '-z', '-M', '--no-abbrev')
+                return self.parse_change_set(output)
+            return []
+        except git.GitCommandError as e:
+            logging.error(f"Error getting change set: {e}")
+            return []
+
+    @staticmethod
+    def parse_change_set(output):
+        tokens = output.split('\0')
+        changes = []
+        by_path = {}
+        i = 0
+
+        while i < len(tokens):
+            token = tokens[i]
+            if token.startswith(':'):
+                # :old_mode new_mode old_sha new_sha status, then one path (or two for renames and copies)
+                old_mode, new_mode, old_sha, new_sha, status = token[1:].split(' ')
+                if status[0] in 'RC':
+                    old_path, path = tokens[i + 1], tokens[i + 2]
+                    i += 3
+                else:
+                    old_path = path = tokens[i + 1]
+                    i += 2
+
+                change = FileChange(
+                    status=GitRepoManager.CHANGE_STATUSES.get(status[0], 'modified'),
+                    path=path,
+                    old_path=old_path,
+                    old_mode=old_mode,
+                    new_mode=new_mode,
+                    old_sha=old_sha,
+                    new_sha=new_sha,
+                    similarity=int(status[1:]) if status[1:] else None,
+                )
+                changes.append(change)
+                by_path[path] = change
+
+            elif token:
+                # additions<TAB>deletions<TAB>path, with an empty path followed by old and new paths for renames
+                additions, deletions, path = token.split('\t', 2)
+                if not path:
+                    path = tokens[i + 2]
+                    i += 3
+                else:
+                    i += 1
+
+                change = by_path.get(path)
+                if change and additions != '-':
+                    change.additions = int(additions)
+                    change.deletions = int(deletions)
+            else:
+                i += 1
+
+        return changes
+
+    @staticmethod
+    def describe_changes(changes):
+        # Files to summarize, plus the added / renamed / removed entries used in the overall summary
+        existing_files = set()
+        all_changes = []
+
+        for change in changes:
+            if change.status in ('added', 'copied'):
+                all_changes.append({'added': change.path})
+            elif change.status == 'renamed':
+                all_changes.append({'renamed': {'old': change.old_path, 'new': change.path}})
+            elif change.status == 'removed':
+                all_changes.append({'removed': change.path})
+            elif change.gitlink:
+                all_changes.append({'submodule updated': f"{change.path} ({change.old_sha[:7]} -> {change.new_sha[:7]})"})
+            elif change.mode_only:
+                all_changes.append({'mode changed': f"{change.path} ({change.old_mode} -> {change.new_mode})"})
+            elif change.binary:
+                all_changes.append({'updated binary': change.path})
+
+            if change.status != 'removed' and change.has_text_changes:
+                existing_files.add(change.path)
+
+        return existing_files, all_changes
+
     def get_commit(self,commit_hexsha):
         try:
             return self.repo.commit(commit_hexsha)
@@ -63,6 +412,15 @@ class GitRepoManager:
             logging.error(f"Error getting commit: {e}")
             return None
     
+    def get_commit_message(self, commit_sha):
+        # Read through the blob reader, which unlike GitPython's object stream is safe to use
+        # while other threads run git commands
+        found = self.blob_reader.read_objects([commit_sha])[0]
+        if found is None or found[1] != 'commit':
+            raise ValueError(f"Unknown commit '{commit_sha}'.")
+        _, _, message = found[2].partition(b"\n\n")
+        return message.decode("utf-8", errors="replace")
+
     def get_parent(self, current_commit):
         try:
             if current_commit.parents:
@@ -76,76 +434,243 @@ class GitRepoManager:
             return None
 
     @staticmethod
-    def parse_diff_files(diff_content):
-        file_diffs = {}
-        current_file = None
+    def iter_diff_files(diff_content, keep_text=True):
+        # Single pass over a diff (a string or any iterable of lines), yielding one DiffFile per file.
+        # Only the current file's lines are held, so the size of the whole diff does not matter.
+        lines = io.StringIO(diff_content) if isinstance(diff_content, str) else diff_content
+        current = None
+        current_lines = []
+        in_header = False
+
+        for line in lines:
+            if line.startswith('diff --git '):
+                if current:
+                    yield GitRepoManager._finish_diff_file(current, current_lines, keep_text)
 
-        for line in diff_content.splitlines():
-            # Check for a new file header in the diff
-            match = re.match(r'diff --git a/(.*) b/(.*)', line)
-            if match:
-                current_file = match.group(2)
-                file_diffs[current_file] = ''
+                old_path, new_path = GitRepoManager._diff_header_paths(line.rstrip('\n'))
+                current = DiffFile(path=new_path, old_path=old_path)
+                current_lines = []
+                in_header = True
 
-            # Add the line to the current file's diff
-            if current_file:
-                file_diffs[current_file] += line + '\n'
+            elif current and line.startswith('@@'):
+                in_header = False
+                GitRepoManager._add_hunk(current, line)
 
-        return file_diffs 
+            elif current and in_header:
+                # Extended header lines, between "diff --git" and the first hunk
+                if line.startswith('new file mode') or line.startswith('--- /dev/null'):
+                    current.status = 'added'
+                elif line.startswith('deleted file mode') or line.startswith('+++ /dev/null'):
+                    current.status = 'removed'
+                    current.path = current.old_path
+                elif line.startswith('rename from '):
+                    current.status = 'renamed'
+                    current.old_path = GitRepoManager.unquote_path(line[12:].rstrip('\n'))
+                elif line.startswith('rename to '):
+                    current.path = GitRepoManager.unquote_path(line[10:].rstrip('\n'))
+                elif line.startswith('copy from '):
+                    current.status = 'added'
+                elif line.startswith('--- a/') or line.startswith('--- "a/'):
+                    current.old_path = GitRepoManager.unquote_path(line[4:].strip())[2:]
+                elif line.startswith('+++ b/') or line.startswith('+++ "b/'):
+                    current.path = GitRepoManager.unquote_path(line[4:].strip())[2:]
+                    if current.status == 'modified' and current.old_path != current.path:
+                        current.status = 'renamed'
+                elif line.startswith('Binary files ') or line.startswith('GIT binary patch'):
+                    current.binary = True
+
+            if current and keep_text:
+                current_lines.append(line)
+
+        if current:
+            yield GitRepoManager._finish_diff_file(current, current_lines, keep_text)
 
     @staticmethod
-    def extract_filenames(diff_content):
-        # This function parse the diff content and extracts each filename and whether it was added, removed, updated, or unchanged.
-        new_filenames = set()
-        unchanged_filenames = set()
-        renamed_filenames = set()
-        removed_filenames = set()
+    def _diff_header_paths(line):
+        # (old_path, new_path) of a "diff --git a/<old> b/<new>" line, either path possibly quoted
+        rest = line[len('diff --git '):]
+        if '"' not in rest:
+            match = GitRepoManager.DIFF_HEADER.match(line)
+            return match.groups() if match else ('', '')
 
-        oldfile = ''
+        quoted = GitRepoManager.QUOTED_PATH.match(rest)
+        if quoted:
+            old_path, new_path = quoted.group(), rest[quoted.end():].strip()
+        else:
+            quoted = GitRepoManager.QUOTED_PATH.search(rest)
+            if not quoted or quoted.end() != len(rest):
+                return '', ''
+            old_path, new_path = rest[:quoted.start()].strip(), quoted.group()
+        return GitRepoManager.unquote_path(old_path)[2:], GitRepoManager.unquote_path(new_path)[2:]
 
-        for line in diff_content.splitlines():
-            if line.startswith('--- a/'):
-                oldfile = line[6:].strip()
-                continue
-            
-            if line.startswith('--- /dev/null'):
-                oldfile = ''
+    @staticmethod
+    def unquote_path(path):
+        # Undoes git's C-style quoting; octal escapes are the UTF-8 bytes of the name
+        if len(path) < 2 or path[0] != '"' or path[-1] != '"':
+            return path
+        body = path[1:-1]
+        data = bytearray()
+        index = 0
+        while index < len(body):
+            char = body[index]
+            if char == '\\' and index + 1 < len(body):
+                octal = re.match(r'[0-7]{3}', body[index + 1:index + 4])
+                if octal:
+                    data.append(int(octal.group(), 8) & 0xFF)
+                    index += 4
+                    continue
+                data += GitRepoManager.PATH_ESCAPES.get(body[index + 1], body[index + 1].encode('utf-8'))
+                index += 2
                 continue
+            data += char.encode('utf-8')
+            index += 1
+        return data.decode('utf-8', errors='replace')
+
+    @staticmethod
+    def _add_hunk(diff_file, line):
+        match = GitRepoManager.HUNK_HEADER.match(line)
+        if match:
+            old_start, old_count, new_start, new_count = match.groups()
+            diff_file.hunks.append((
+                int(old_start), int(old_count) if old_count is not None else 1,
+                int(new_start), int(new_count) if new_count is not None else 1,
+            ))
 
-            if line.startswith('+++ b/'):
-                currentfile = line[6:].strip()
+    @staticmethod
+    def _finish_diff_file(diff_file, lines, keep_text):
+        if keep_text:
+            diff_file.text = ''.join(lines)
+            if not diff_file.text.endswith('\n'):
+                diff_file.text += '\n'
+        return diff_file
 
-                if oldfile == '':
-                    new_filenames.add(currentfile)
-                elif oldfile == currentfile:
-                    unchanged_filenames.add(currentfile)
-                else:
-                    renamed_filenames.add((oldfile, currentfile))
-                continue
+    @staticmethod
+    def parse_diff_files(diff_content):
+        return {diff_file.path: diff_file.text for diff_file in GitRepoManager.iter_diff_files(diff_content)}
 
-            if line.startswith('+++ /dev/null'): 
-                removed_filenames.add(oldfile)
+    @staticmethod
+    def extract_filenames(diff_content):
+        # This function parse the diff content and extracts each filename and whether it was added, removed, renamed or updated.
+        all_filenames = set()
+        all_changes = []
+
+        for diff_file in GitRepoManager.iter_diff_files(diff_content, keep_text=False):
+            if diff_file.status == 'added':
+                all_changes.append({'added': diff_file.path})
+            elif diff_file.status == 'renamed':
+                all_changes.append({'renamed': {'old': diff_file.old_path, 'new': diff_file.path}})
+            elif diff_file.status == 'removed':
+                all_changes.append({'removed': diff_file.path})
 
-        all_filenames = new_filenames | unchanged_filenames | set(item[1] for item in renamed_filenames)
+            # Only files with textual changes are summarized
+            if diff_file.status != 'removed' and diff_file.hunks:
+                all_filenames.add(diff_file.path)
 
-        all_changes = [
-            {'added': filename} for filename in new_filenames
-        ] + [
-            {'renamed': {'old': oldfile, 'new': currentfile}} for oldfile, currentfile in renamed_filenames
-        ] + [
-            {'removed': filename} for filename in removed_filenames
-        ]
         return all_filenames, all_changes
 
 
     def get_raw_file_content(self, commit_sha, file_path):
         # Retrieve the raw files from the git stash - Note this doesn't work on deleted files.
+        blob_sha, content = self.get_raw_file_contents(commit_sha, [file_path]).get(file_path, (None, None))
+        return content
+
+    @traced("git.read_files")
+    def get_raw_file_contents(self, commit_sha, file_paths):
+        # Fetch the files of a commit in one batched request. Returns {path: (blob_sha, content)};
+        # content is None for binary files, and missing files are left out.
         try:
-            commit = self.repo.commit(commit_sha)
-            return commit.tree[file_path].data_stream.read().decode('utf-8')
-        except git.GitError as e:
+            objects = self.blob_reader.read_objects([f"{commit_sha}:{file_path}" for file_path in file_paths])
+        except (git.GitError, OSError) as e:
             logging.error(f"Git error occurred: {e}")
+            return {}
+
+        contents = {}
+        for file_path, found in zip(file_paths, objects):
+            if found is None:
+                logging.error(f"File {file_path} not found in commit {commit_sha}")
+                continue
+            blob_sha, _, data = found
+            contents[file_path] = (blob_sha, self.decode_blob(data))
+        return contents
+
+    def iter_raw_file_contents(self, commit_sha, file_paths):
+        # get_raw_file_contents in batches, yielding (paths, contents)
+        sizes = self.get_object_sizes([f"{commit_sha}:{file_path}" for file_path in file_paths])
+        for batch in self.batch_by_size(file_paths, sizes):
+            yield batch, self.get_raw_file_contents(commit_sha, batch)
+
+    def batch_by_size(self, names, sizes):
+        # Splits names into batches by their object sizes. The raw and the decoded content of a
+        # batch are both held while it is decoded, so a batch gets half of commit_memory_bytes;
+        # a larger object is read on its own.
+        budget = self.commit_memory_bytes // 2
+        batch = []
+        batch_bytes = 0
+        for name, size in zip(names, sizes):
+            if batch and batch_bytes + (size or 0) > budget:
+                yield batch
+                batch = []
+                batch_bytes = 0
+            batch.append(name)
+            batch_bytes += size or 0
+        if batch:
+            yield batch
+
+    @traced("git.ls_tree")
+    def get_tree_blobs(self, commit_sha):
+        # {blob_sha: path} for every file in the commit's tree
+        try:
+            output = self.repo.git.ls_tree('-r', '-z', '--full-tree', commit_sha)
+        except git.GitCommandError as e:
+            logging.error(f"Error listing tree of {commit_sha}: {e}")
+            return {}
+
+        blobs = {}
+        for entry in output.split('\0'):
+            if not entry:
+                continue
+            info, path = entry.split('\t', 1)
+            _, object_type, sha = info.split(' ')
+            if object_type == 'blob':
+                blobs[sha] = path
+        return blobs
+
+    def get_object_sizes(self, object_names):
+        # Sizes in bytes from `git cat-file --batch-check`, without reading the objects; None for missing ones
+        if not object_names:
+            return []
+        try:
+            output = subprocess.run(
+                ["git", "cat-file", "--batch-check"],
+                cwd=self.repo.working_dir,
+                input="".join(f"{name}\n" for name in object_names).encode("utf-8"),
+                capture_output=True,
+                check=True,
+            ).stdout
+        except (subprocess.CalledProcessError, OSError) as e:
+            logging.error(f"Error reading object sizes: {e}")
+            return [None] * len(object_names)
+
+        sizes = []
+        for line in output.split(b"\n")[:len(object_names)]:
+            # "<sha> <type> <size>", or "<name> missing" where the name may contain spaces
+            try:
+                found = BlobReader.parse_header(line)
+            except git.GitError as e:
+                logging.error(f"Error reading object size: {e}")
+                found = None
+            sizes.append(found[2] if found is not None else None)
+        return sizes
+
+    def get_branch_heads(self):
+        return [head.commit.hexsha for head in self.repo.heads]
+
+    @staticmethod
+    def decode_blob(data):
+        # Treat content with NUL bytes as binary, like git does, and tolerate non UTF-8 text
+        if b"\0" in data[:8000]:
             return None
+        return data.decode("utf-8", errors="replace")
 
 
     # Run this script directly to get the current branch, commit, and message. 
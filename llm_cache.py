@@ -0,0 +1,115 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import warnings
+from dotenv import load_dotenv
+from langchain_core._api import LangChainBetaWarning
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+
+from utility import Utility
+from embedding_cache import CACHE_DIR
+from tracing import tracer
+
+load_dotenv()
+
+# Serializing cached generations would otherwise warn on every lookup and update. A process-wide
+# filter, since warnings.catch_warnings() is not safe with lookups from several threads.
+warnings.filterwarnings("ignore", message=r"The function `(dumps|loads)` is in beta", category=LangChainBetaWarning)
+
+
+class SQLiteResponseCache(BaseCache):
+    # Persistent langchain LLM cache. Responses are keyed on a hash of the model parameters
+    # (model name, temperature, ...) and the rendered prompt, expire after ttl_seconds and are
+    # evicted least recently used first once max_entries is exceeded.
+
+    def __init__(self, path=None, ttl_seconds=None, max_entries=None):
+        self.path = path or os.path.join(CACHE_DIR, "llm_responses.sqlite")
+        self.ttl_seconds = ttl_seconds or float(os.getenv("LLM_CACHE_TTL_HOURS", "168")) * 3600
+        self.max_entries = max_entries or int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+        self.hits = 0
+        self.misses = 0
+        self.saved_tokens = 0
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses "
+            "(key TEXT PRIMARY KEY, response TEXT, tokens INTEGER, created REAL, accessed REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(prompt, llm_string):
+        return hashlib.sha256(f"{llm_string}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt, llm_string):
+        key = self.make_key(prompt, llm_string)
+        now = time.time()
+
+        with self.lock:
+            row = self.conn.execute("SELECT response, tokens, created FROM responses WHERE key = ?", (key,)).fetchone()
+
+        generations = None
+        if row is not None and now - row[2] <= self.ttl_seconds:
+            try:
+                generations = [loads(generation) for generation in loads(row[0])]
+            except Exception as e:
+                logging.warning(f"Ignoring unreadable LLM cache entry: {e}")
+
+        with self.lock:
+            if generations is None:
+                self.misses += 1
+                tracer.count("llm_cache.misses")
+                return None
+
+            self.hits += 1
+            self.saved_tokens += row[1]
+            tracer.count("llm_cache.hits")
+            tracer.count("llm_cache.saved_tokens", row[1])
+            self.conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+        return generations
+
+    def update(self, prompt, llm_string, return_val):
+        response = dumps([dumps(generation) for generation in return_val])
+        # Tokens a later hit saves: the prompt sent plus the completion received
+        tokens = Utility.count_tokens(prompt) + sum(Utility.count_tokens(generation.text) for generation in return_val)
+        now = time.time()
+
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, tokens, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (self.make_key(prompt, llm_string), response, tokens, now, now)
+            )
+            self.evict(now)
+            self.conn.commit()
+
+    def evict(self, now):
+        # Drop expired entries, then the least recently used ones above max_entries. Caller holds the lock.
+        self.conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,))
+        count = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        if count > self.max_entries:
+            self.conn.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def clear(self, **kwargs):
+        with self.lock:
+            self.conn.execute("DELETE FROM responses")
+            self.conn.commit()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "saved_tokens": self.saved_tokens,
+        }
@@ -0,0 +1,165 @@
+import logging
+import os
+import threading
+import time
+from langchain.embeddings.sentence_transformer import SentenceTransformerEmbeddings
+from langchain.globals import set_llm_cache
+from langchain_core.callbacks import BaseCallbackHandler
+
+from utility import Utility
+from embedding_cache import EmbeddingCache, EmbeddingScheduler
+from llm_cache import SQLiteResponseCache
+from tracing import tracer
+
+
+class TraceCallbackHandler(BaseCallbackHandler):
+    # Records every LLM call as an "llm.call" span, with the tokens the server reports
+
+    def __init__(self):
+        self.starts = {}
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        if tracer.enabled:
+            self.starts[run_id] = time.perf_counter_ns()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        if tracer.enabled:
+            self.starts[run_id] = time.perf_counter_ns()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        start = self.starts.pop(run_id, None)
+        if start is None:
+            return
+        # Streamed responses carry no usage
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        tracer.record("llm.call", start, time.perf_counter_ns(), dict(usage))
+        tracer.count("llm.calls")
+        tracer.count("llm.prompt_tokens", usage.get("prompt_tokens", 0))
+        tracer.count("llm.completion_tokens", usage.get("completion_tokens", 0))
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        start = self.starts.pop(run_id, None)
+        if start is not None:
+            tracer.record("llm.call", start, time.perf_counter_ns(), {"error": type(error).__name__})
+            tracer.count("llm.errors")
+
+
+class ModelRegistry:
+    # Process-wide registry of models and clients. Everything is created on first use and
+    # shared afterwards, so multi-commit runs only pay the load cost once.
+
+    DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-mpnet-base-v2"
+
+    _lock = threading.RLock()
+    _embeddings = {}
+    _llms = {}
+    _embedding_cache = None
+    _embedding_schedulers = {}
+    _embedding_dimensions = {}
+    _llm_cache = None
+    _trace_handler = TraceCallbackHandler()
+    load_stats = []
+
+    @classmethod
+    def embedding_model(cls):
+        # The configured model as "<name>" for the PyTorch backend and "<name>#<backend>"
+        # otherwise, also used to key the embedding cache and the repository index
+        model_name = os.getenv("EMBEDDING_MODEL", cls.DEFAULT_EMBEDDING_MODEL)
+        backend = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+        return model_name if backend == "torch" else f"{model_name}#{backend}"
+
+    @classmethod
+    def get_embeddings(cls, model_name=None):
+        model_name = model_name or cls.embedding_model()
+        with cls._lock:
+            if model_name not in cls._embeddings:
+                cls._embeddings[model_name] = cls._timed_load(f"embeddings:{model_name}", lambda: cls._load_embeddings(model_name))
+            return cls._embeddings[model_name]
+
+    @staticmethod
+    def _load_embeddings(model_name):
+        name, _, backend = model_name.partition("#")
+        backend = backend or "torch"
+        batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+        threads = int(os.getenv("EMBEDDING_THREADS", "0")) or None
+
+        if backend == "torch":
+            if threads:
+                import torch
+                torch.set_num_threads(threads)
+            return SentenceTransformerEmbeddings(model_name=name, encode_kwargs={"batch_size": batch_size})
+        if backend in ("onnx", "onnx-int8"):
+            from onnx_embeddings import OnnxEmbeddings
+            return OnnxEmbeddings(name, quantize=backend == "onnx-int8", batch_size=batch_size, threads=threads)
+        raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}', expected torch, onnx or onnx-int8.")
+
+    @classmethod
+    def embedding_dimensions(cls, model_name=None):
+        # Length of the model's vectors, from encoding one probe text once
+        model_name = model_name or cls.embedding_model()
+        with cls._lock:
+            if model_name not in cls._embedding_dimensions:
+                cls._embedding_dimensions[model_name] = len(cls.get_embeddings(model_name).embed_query("dimensions"))
+            return cls._embedding_dimensions[model_name]
+
+    @classmethod
+    def get_embedding_scheduler(cls, model_name=None):
+        model_name = model_name or cls.embedding_model()
+        with cls._lock:
+            if model_name not in cls._embedding_schedulers:
+                cls._embedding_schedulers[model_name] = EmbeddingScheduler(cls.get_embeddings(model_name))
+            return cls._embedding_schedulers[model_name]
+
+    @classmethod
+    def get_llm(cls, **kwargs):
+        key = tuple(sorted(kwargs.items()))
+        with cls._lock:
+            cls.get_llm_cache()
+            if key not in cls._llms:
+                llm = cls._timed_load(f"llm:{dict(key)}", lambda: Utility.load_LLM(**kwargs))
+                llm.callbacks = [cls._trace_handler]
+                cls._llms[key] = llm
+            return cls._llms[key]
+
+    @classmethod
+    def get_embedding_cache(cls):
+        with cls._lock:
+            if cls._embedding_cache is None:
+                cls._embedding_cache = EmbeddingCache()
+            return cls._embedding_cache
+
+    @classmethod
+    def get_llm_cache(cls):
+        # Installed as langchain's global cache, so every chain built on these clients uses it
+        with cls._lock:
+            if cls._llm_cache is None and os.getenv("LLM_CACHE", "True").lower() == "true":
+                cls._llm_cache = SQLiteResponseCache()
+                set_llm_cache(cls._llm_cache)
+            return cls._llm_cache
+
+    @classmethod
+    def _timed_load(cls, name, loader):
+        rss_before = Utility.get_rss_mb()
+        start = time.perf_counter()
+        model = loader()
+        elapsed = time.perf_counter() - start
+        rss_after = Utility.get_rss_mb()
+
+        cls.load_stats.append({
+            "name": name,
+            "seconds": round(elapsed, 3),
+            "rss_mb": round(rss_after, 1),
+            "rss_delta_mb": round(rss_after - rss_before, 1),
+        })
+        logging.info(f"Loaded {name} in {elapsed:.2f}s (RSS {rss_after:.0f} MB, +{rss_after - rss_before:.0f} MB)")
+        return model
+
+    @classmethod
+    def stats(cls):
+        return {
+            "loads": list(cls.load_stats),
+            "rss_mb": round(Utility.get_rss_mb(), 1),
+            "embedding_cache": cls._embedding_cache.stats() if cls._embedding_cache else None,
+            "embedding_schedulers": {name: scheduler.stats() for name, scheduler in cls._embedding_schedulers.items()},
+            "llm_cache": cls._llm_cache.stats() if cls._llm_cache else None,
+        }
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from embedding_cache import CACHE_DIR
+
+
+class OnnxEmbeddings(Embeddings):
+    # Sentence-transformer models on ONNX Runtime instead of PyTorch, for CPU-only machines:
+    # faster to load and to encode. The model's ONNX export is taken from its onnx/ folder on the
+    # Hugging Face hub (or a local directory); quantize=True converts the weights to int8 once
+    # and keeps the result in CACHE_DIR/onnx. Token embeddings are mean pooled and normalized,
+    # like the sentence-transformers models do. Needs `pip install onnxruntime`.
+
+    def __init__(self, model_name, quantize=False, batch_size=32, threads=None):
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise ImportError("The onnx embedding backends need onnxruntime: pip install onnxruntime") from e
+        from tokenizers import Tokenizer
+
+        self.model_name = model_name
+        self.batch_size = batch_size
+
+        model_path = self.model_file(model_name)
+        if quantize:
+            model_path = self.quantize(model_path)
+
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(self.resolve(model_name, "tokenizer.json"))
+        self.tokenizer.enable_truncation(self.max_seq_length(model_name))
+        pad_token = next((token for token in ("<pad>", "[PAD]") if self.tokenizer.token_to_id(token) is not None), None)
+        if pad_token is not None:
+            self.tokenizer.enable_padding(pad_id=self.tokenizer.token_to_id(pad_token), pad_token=pad_token)
+        else:
+            self.tokenizer.enable_padding()
+
+    @staticmethod
+    def resolve(model_name, filename):
+        # A file of the model, from a local model directory or the Hugging Face cache
+        if os.path.isdir(model_name):
+            path = os.path.join(model_name, filename)
+            if not os.path.exists(path):
+                raise FileNotFoundError(path)
+            return path
+        from huggingface_hub import hf_hub_download
+        return hf_hub_download(model_name, filename)
+
+    @classmethod
+    def model_file(cls, model_name):
+        for filename in ("onnx/model.onnx", "model.onnx"):
+            try:
+                return cls.resolve(model_name, filename)
+            except Exception as e:
+                logging.info(f"No {filename} for {model_name}: {e}")
+        raise ValueError(f"No ONNX export found for embedding model '{model_name}'.")
+
+    @classmethod
+    def max_seq_length(cls, model_name):
+        # Longer inputs are truncated, as sentence-transformers does for the same model
+        try:
+            with open(cls.resolve(model_name, "sentence_bert_config.json")) as file:
+                return int(json.load(file)["max_seq_length"])
+        except Exception:
+            return 512
+
+    @staticmethod
+    def quantize(model_path):
+        # Dynamic int8 quantization of the weights, done once per model file
+        stat = os.stat(model_path)
+        key = hashlib.sha1(f"{os.path.realpath(model_path)}|{stat.st_size}|{stat.st_mtime}".encode("utf-8")).hexdigest()[:16]
+        quantized_path = os.path.join(CACHE_DIR, "onnx", f"{key}-int8.onnx")
+        if not os.path.exists(quantized_path):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            os.makedirs(os.path.dirname(quantized_path), exist_ok=True)
+            temporary_path = f"{quantized_path}.{os.getpid()}.tmp"
+            quantize_dynamic(model_path, temporary_path, weight_type=QuantType.QInt8)
+            os.replace(temporary_path, quantized_path)
+            logging.info(f"Quantized {model_path} to {quantized_path}")
+        return quantized_path
+
+    def encode(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            inputs["token_type_ids"] = np.zeros_like(input_ids)
+
+        output = self.session.run(None, inputs)[0]
+        if output.ndim == 3:
+            # Mean of the token embeddings, leaving out padding
+            mask = attention_mask[:, :, None].astype(np.float32)
+            output = (output * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(output, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return output / norms
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        # Texts of similar length are batched together, so little of each batch is padding
+        order = sorted(range(len(texts)), key=lambda index: len(texts[index]))
+        vectors = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            for index, vector in zip(batch, self.encode([texts[index] for index in batch])):
+                vectors[index] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
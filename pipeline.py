@@ -0,0 +1,145 @@
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import Future, wait
+from rich.progress import BarColumn, Progress, SpinnerColumn, TaskProgressColumn, TimeElapsedColumn
+
+from tracing import tracer
+
+
+class StagePipeline:
+    # Runs named stages on an executor, each as soon as the stages it depends on have finished,
+    # so independent stages overlap. The listener is called with ("started" | "finished" |
+    # "failed", stage) as stages change state, and wall times per stage are kept in timings.
+
+    def __init__(self, executor, listener=None):
+        self.executor = executor
+        self.listener = listener
+        self.futures = {}
+        self.timings = {}
+        self.lock = threading.Lock()
+
+    def add(self, name, function, *dependencies):
+        # function is called with the results of its dependencies, in the order given
+        future = Future()
+        self.futures[name] = future
+        inputs = [self.futures[dependency] for dependency in dependencies]
+        remaining = [len(inputs)]
+        # Stages run with the context they were added in, e.g. the commit being traced
+        context = contextvars.copy_context()
+
+        def dependency_done(_):
+            with self.lock:
+                remaining[0] -= 1
+                ready = remaining[0] == 0
+            if ready:
+                failed = self.failure(inputs)
+                if failed is not None:
+                    # A failed dependency fails every stage after it with the same error
+                    future.set_exception(failed)
+                else:
+                    self.executor.submit(context.run, self.run_stage, name, function, inputs, future)
+
+        if not inputs:
+            self.executor.submit(context.run, self.run_stage, name, function, inputs, future)
+        for dependency in inputs:
+            dependency.add_done_callback(dependency_done)
+        return future
+
+    def adopt(self, name, future):
+        # A stage computed elsewhere, e.g. a commit prepared ahead of time in batch mode
+        self.futures[name] = future
+        self.emit("started", name)
+        future.add_done_callback(lambda done: self.emit("failed" if done.exception() else "finished", name))
+        return future
+
+    @staticmethod
+    def failure(inputs):
+        return next((dependency.exception() for dependency in inputs if dependency.exception() is not None), None)
+
+    def run_stage(self, name, function, inputs, future):
+        self.emit("started", name)
+        start = time.perf_counter()
+        try:
+            with tracer.span(f"stage.{name}"):
+                result = function(*[dependency.result() for dependency in inputs])
+        except Exception as e:
+            self.timings[name] = time.perf_counter() - start
+            self.emit("failed", name)
+            future.set_exception(e)
+            return
+        self.timings[name] = time.perf_counter() - start
+        self.emit("finished", name)
+        future.set_result(result)
+
+    def emit(self, event, name):
+        if self.listener is not None:
+            try:
+                self.listener(event, name)
+            except Exception as e:
+                logging.warning(f"Stage listener failed on {event} {name}: {e}")
+
+    def result(self, name):
+        return self.futures[name].result()
+
+    def wait(self):
+        # Lets stages still running, e.g. after an earlier stage failed, settle
+        wait(list(self.futures.values()))
+
+    def log_timings(self):
+        logging.info("Stage timings: %s", ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.timings.items()))
+
+
+class StageProgress:
+    # Progress bars driven by pipeline events: a bar appears when a stage starts and completes
+    # when it finishes. File summaries advance the summarize bar one by one.
+
+    def __init__(self, console, labels):
+        self.labels = labels
+        self.tasks = {}
+        self.progress = Progress(
+            SpinnerColumn(),
+            "[progress.description]{task.description}",
+            BarColumn(style="black", complete_style="green", finished_style="green", pulse_style="white", bar_width=30),
+            TaskProgressColumn(),
+            "Elapsed:",
+            TimeElapsedColumn(),
+            console=console,
+        )
+
+    def __enter__(self):
+        self.progress.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.progress.stop()
+
+    def __call__(self, event, stage):
+        label = self.labels.get(stage)
+        if label is None:
+            return
+        if event == "started":
+            self.tasks[stage] = self.progress.add_task(f"[cyan] {label}", total=None)
+        elif event == "finished":
+            total = self.task(stage).total or 1
+            self.progress.update(self.tasks[stage], total=total, completed=total)
+        elif event == "failed":
+            self.progress.update(self.tasks[stage], description=f"[red] {label}")
+            self.progress.stop_task(self.tasks[stage])
+
+    def task(self, stage):
+        return next(task for task in self.progress.tasks if task.id == self.tasks[stage])
+
+    def set_total(self, stage, total):
+        if stage in self.tasks and total:
+            self.progress.update(self.tasks[stage], total=total)
+
+    def file_done(self, file, summary):
+        task = self.tasks.get("summarize")
+        if task is None:
+            return
+        self.progress.advance(task)
+        state = self.task("summarize")
+        if state.total is not None and state.completed >= state.total:
+            self.progress.update(task, description=f"[cyan] {self.labels.get('overall', self.labels['summarize'])}")
@@ -0,0 +1,204 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+from dotenv import load_dotenv
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from embedding_cache import CACHE_DIR
+
+load_dotenv()
+
+NULL_SHA = "0" * 40
+
+
+class RepoIndex:
+    # Persistent chunk index of one repository, keyed by git blob SHA. Every processed commit
+    # adds the blobs it introduces, so over time the index covers the files around a change
+    # (callers, tests) and retrieval can pull related context from files the commit did not
+    # touch. Searches only run over blobs in the commit's tree, and blobs no branch head
+    # references any more are garbage collected, so the searched set follows the size of the
+    # repository rather than its history.
+
+    def __init__(self, git_repo_manager, model_name, chunk_size, chunk_overlap, path=None):
+        self.git_repo_manager = git_repo_manager
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.related_k = int(os.getenv("REPO_INDEX_RELATED", "3"))
+        self.max_file_bytes = int(os.getenv("REPO_INDEX_MAX_FILE_KB", "256")) * 1024
+        self.bootstrap = os.getenv("REPO_INDEX_BOOTSTRAP", "False").lower() == "true"
+        self.gc_interval = int(os.getenv("REPO_INDEX_GC_INTERVAL", "50"))
+        self.lock = threading.RLock()
+        self.staged = {}
+        self.tree_cache = {}
+
+        repo_path = os.path.realpath(git_repo_manager.repo.working_dir)
+        index_key = hashlib.sha1(f"{repo_path}|{model_name}|{chunk_size}|{chunk_overlap}".encode("utf-8")).hexdigest()[:16]
+        self.path = path or os.path.join(CACHE_DIR, "repo_index", f"{index_key}.sqlite")
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS blobs (sha TEXT PRIMARY KEY, path TEXT, chunks INTEGER, indexed REAL)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS chunks (sha TEXT, seq INTEGER, text TEXT, vector BLOB, PRIMARY KEY (sha, seq))")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.commit()
+        self.load()
+
+    def load(self):
+        # Keep only the vectors in memory, chunk text is read back for the results
+        rows = self.conn.execute("SELECT sha, seq, vector FROM chunks ORDER BY sha, seq").fetchall()
+        self.blob_ids = {}
+        self.blob_shas = []
+        self.row_blobs = np.array([self.blob_id(sha) for sha, _, _ in rows], dtype=np.int64)
+        self.row_seqs = np.array([seq for _, seq, _ in rows], dtype=np.int64)
+        if rows:
+            self.matrix = np.ascontiguousarray(np.stack([np.frombuffer(vector, dtype=np.float32) for _, _, vector in rows]))
+        else:
+            self.matrix = None
+        logging.info("Repository index %s: %d blobs, %d chunks", self.path, len(self.blob_ids), len(rows))
+
+    def blob_id(self, sha):
+        if sha not in self.blob_ids:
+            self.blob_ids[sha] = len(self.blob_shas)
+            self.blob_shas.append(sha)
+        return self.blob_ids[sha]
+
+    def is_indexed(self, sha):
+        return self.conn.execute("SELECT 1 FROM blobs WHERE sha = ?", (sha,)).fetchone() is not None
+
+    def tree_blobs(self, commit):
+        if commit not in self.tree_cache:
+            self.tree_cache = {commit: self.git_repo_manager.get_tree_blobs(commit)}
+        return self.tree_cache[commit]
+
+    def stage(self, commit, changes):
+        # Reads the blobs a commit adds and returns their (content_key, [chunk texts]) groups for
+        # embedding. On an empty index with REPO_INDEX_BOOTSTRAP the whole tree is staged once.
+        with self.lock:
+            if self.bootstrap and self.matrix is None and not self.staged:
+                candidates = self.tree_blobs(commit)
+            else:
+                candidates = {
+                    change.new_sha: change.path for change in changes
+                    if change.status != 'removed' and change.new_sha != NULL_SHA and not change.binary and not change.gitlink
+                }
+            candidates = {sha: path for sha, path in candidates.items() if sha not in self.staged and not self.is_indexed(sha)}
+
+            # Oversized blobs are left out by their size alone, the rest is read in batches
+            shas = list(candidates)
+            sizes = self.git_repo_manager.get_object_sizes(shas)
+            kept = [(sha, size) for sha, size in zip(shas, sizes) if size is not None and size <= self.max_file_bytes]
+
+            splitter = RecursiveCharacterTextSplitter(chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap)
+            groups = []
+            for batch in self.git_repo_manager.batch_by_size([sha for sha, _ in kept], [size for _, size in kept]):
+                objects = self.git_repo_manager.blob_reader.read_objects(batch)
+                for sha, found in zip(batch, objects):
+                    if found is None or found[1] != "blob":
+                        continue
+                    content = self.git_repo_manager.decode_blob(found[2])
+                    if not content:
+                        continue
+                    texts = splitter.split_text(content)
+                    self.staged[sha] = (candidates[sha], texts)
+                    groups.append((f"blob:{sha}", texts))
+            return groups
+
+    def store(self, embedding_function):
+        # Persists the staged blobs once their chunks are embedded
+        with self.lock:
+            if not self.staged:
+                return
+
+            now = time.time()
+            vectors = []
+            for sha, (path, texts) in self.staged.items():
+                blob_vectors = np.asarray(embedding_function.embed_documents(texts), dtype=np.float32)
+                norms = np.linalg.norm(blob_vectors, axis=1, keepdims=True)
+                norms[norms == 0] = 1.0
+                blob_vectors = blob_vectors / norms
+                self.conn.execute("INSERT OR REPLACE INTO blobs (sha, path, chunks, indexed) VALUES (?, ?, ?, ?)", (sha, path, len(texts), now))
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO chunks (sha, seq, text, vector) VALUES (?, ?, ?, ?)",
+                    [(sha, seq, text, vector.tobytes()) for seq, (text, vector) in enumerate(zip(texts, blob_vectors))]
+                )
+                vectors.append(blob_vectors)
+                self.row_blobs = np.concatenate([self.row_blobs, np.full(len(texts), self.blob_id(sha), dtype=np.int64)])
+                self.row_seqs = np.concatenate([self.row_seqs, np.arange(len(texts), dtype=np.int64)])
+
+            new_rows = np.concatenate(vectors)
+            self.matrix = new_rows if self.matrix is None else np.ascontiguousarray(np.concatenate([self.matrix, new_rows]))
+
+            updates = int((self.conn.execute("SELECT value FROM meta WHERE key = 'updates'").fetchone() or ("0",))[0]) + 1
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('updates', ?)", (str(updates),))
+            self.conn.commit()
+            logging.info("Repository index: added %d blobs (%d chunks)", len(self.staged), len(new_rows))
+            self.staged = {}
+
+        if self.gc_interval and updates % self.gc_interval == 0:
+            self.gc()
+
+    def related(self, commit, changes, files):
+        # {file: related context} for each given file, from files of the commit's tree that the
+        # commit did not change. The query is the mean of the file's own chunk vectors.
+        with self.lock:
+            if self.matrix is None or not self.related_k:
+                return {}
+
+            tree = self.tree_blobs(commit)
+            changed_paths = {change.path for change in changes} | {change.old_path for change in changes}
+            candidate_ids = [self.blob_ids[sha] for sha, path in tree.items() if sha in self.blob_ids and path not in changed_paths]
+            if not candidate_ids:
+                return {}
+            rows = np.flatnonzero(np.isin(self.row_blobs, candidate_ids))
+            if not len(rows):
+                return {}
+
+            new_shas = {change.path: change.new_sha for change in changes}
+            queries = []
+            query_files = []
+            for file in files:
+                blob_id = self.blob_ids.get(new_shas.get(file))
+                if blob_id is None:
+                    continue
+                own_rows = self.matrix[self.row_blobs == blob_id]
+                if len(own_rows):
+                    queries.append(own_rows.mean(axis=0))
+                    query_files.append(file)
+            if not queries:
+                return {}
+
+            start = time.perf_counter()
+            scores = np.stack(queries) @ self.matrix[rows].T
+            k = min(self.related_k, len(rows))
+            related = {}
+            for file, file_scores in zip(query_files, scores):
+                top = np.argpartition(-file_scores, k - 1)[:k]
+                top = top[np.argsort(-file_scores[top])]
+                sections = []
+                for row in rows[top]:
+                    sha = self.blob_shas[self.row_blobs[row]]
+                    (text,) = self.conn.execute("SELECT text FROM chunks WHERE sha = ? AND seq = ?", (sha, int(self.row_seqs[row]))).fetchone()
+                    sections.append(f"--- {tree[sha]} ---\n{text}")
+                related[file] = "\n\n".join(sections)
+            logging.info("Repository index: related context for %d files from %d chunks in %.3fs", len(related), len(rows), time.perf_counter() - start)
+            return related
+
+    def gc(self):
+        # Drops blobs that are not in the tree of any branch head
+        with self.lock:
+            start = time.perf_counter()
+            live = set()
+            for head in self.git_repo_manager.get_branch_heads():
+                live.update(self.git_repo_manager.get_tree_blobs(head))
+
+            dead = [(sha,) for (sha,) in self.conn.execute("SELECT sha FROM blobs") if sha not in live]
+            if dead:
+                self.conn.executemany("DELETE FROM chunks WHERE sha = ?", dead)
+                self.conn.executemany("DELETE FROM blobs WHERE sha = ?", dead)
+                self.conn.commit()
+                self.load()
+            logging.info("Repository index: collected %d unreachable blobs in %.2fs", len(dead), time.perf_counter() - start)
+            return len(dead)
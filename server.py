@@ -0,0 +1,249 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from queue import Queue, Empty
+from dotenv import load_dotenv
+
+from utility import Utility
+from git_repo_manager import GitRepoManager
+
+
+class RequestError(Exception):
+    # The request itself is wrong (bad body, unknown repository or commit); answered with 400
+    pass
+
+
+class SummaryService:
+    # Keeps the models and one GitRepoManager / CodeSummarization per configured repository warm.
+    # Requests are queued and handled by a single worker, which takes up to max_batch requests
+    # at a time, answers identical ones once and prepares the next commit while the LLM runs.
+
+    def __init__(self, repos=None):
+        load_dotenv()
+        configured = repos or os.getenv("SERVE_REPOS") or os.getenv("DEVPATH", ".")
+        self.repos = [os.path.realpath(path.strip()) for path in configured.split(",") if path.strip()]
+        self.max_batch = int(os.getenv("SERVE_MAX_BATCH", "8"))
+        self.confidence_level = int(os.getenv("CONFIDENCE", "60"))
+        self.queue = Queue()
+        self.summarizers = {}
+        self.latencies = deque(maxlen=int(os.getenv("SERVE_LATENCY_WINDOW", "1000")))
+        self.latency_lock = threading.Lock()
+        self.requests = 0
+        self.worker = threading.Thread(target=self.work, daemon=True)
+
+    def start(self):
+        # Load everything up front so the first request does not pay for it
+        for repo in self.repos:
+            self.get_summarizer(repo)
+        self.worker.start()
+
+    def get_summarizer(self, repo):
+        if repo not in self.summarizers:
+            from commit_analysis import CodeSummarization
+            self.summarizers[repo] = CodeSummarization(GitRepoManager(repo))
+        return self.summarizers[repo]
+
+    def submit(self, kind, repo, commit, message=None):
+        repo = os.path.realpath(repo) if repo else self.repos[0]
+        if repo not in self.repos:
+            raise RequestError(f"Repository '{repo}' is not configured in SERVE_REPOS.")
+
+        future = Future()
+        self.queue.put((kind, repo, commit or "HEAD", message, future))
+        return future
+
+    def work(self):
+        while True:
+            jobs = [self.queue.get()]
+            while len(jobs) < self.max_batch:
+                try:
+                    jobs.append(self.queue.get_nowait())
+                except Empty:
+                    break
+            try:
+                self.process_batch(jobs)
+            except Exception as e:
+                # Keep the worker alive, and never leave a request waiting on an unresolved future
+                logging.error(f"Error processing batch of {len(jobs)} requests: {e}", exc_info=True)
+                for job in jobs:
+                    self.fail(job[-1], e)
+
+    def process_batch(self, jobs):
+        # Group the batch by (repository, commit) so every commit is summarized once
+        groups = {}
+        for job in jobs:
+            kind, repo, commit_ref, message, future = job
+            try:
+                commit = self.get_summarizer(repo).git_repo_manager.get_commit(commit_ref)
+            except Exception:
+                commit = None
+            if commit is None:
+                self.fail(future, RequestError(f"Unknown commit '{commit_ref}' in '{repo}'."))
+                continue
+            groups.setdefault((repo, commit.hexsha), (commit, []))[1].append(job)
+
+        keys = list(groups)
+        with ThreadPoolExecutor(max_workers=1) as prefetcher:
+            upcoming = prefetcher.submit(self.prepare, *keys[0]) if keys else None
+            for index, (repo, hexsha) in enumerate(keys):
+                prepared = upcoming
+                if index + 1 < len(keys):
+                    upcoming = prefetcher.submit(self.prepare, *keys[index + 1])
+
+                commit, group = groups[(repo, hexsha)]
+                try:
+                    generated_commit_message = self.get_summarizer(repo).summarize_prepared(prepared.result())
+                except Exception as e:
+                    logging.error(f"Error processing {hexsha} in {repo}: {e}", exc_info=True)
+                    for job in group:
+                        self.fail(job[-1], e)
+                    continue
+
+                # Each request of the group is answered on its own, so a failed comparison
+                # only fails that request
+                for kind, _, _, message, future in group:
+                    try:
+                        result = self.build_result(kind, repo, commit, message, generated_commit_message)
+                    except Exception as e:
+                        logging.error(f"Error building {kind} result for {hexsha} in {repo}: {e}", exc_info=True)
+                        self.fail(future, e)
+                    else:
+                        if not future.done():
+                            future.set_result(result)
+
+    @staticmethod
+    def fail(future, error):
+        # A future can already be resolved when a later step of its batch fails
+        if not future.done():
+            future.set_exception(error)
+
+    def prepare(self, repo, hexsha):
+        summarizer = self.get_summarizer(repo)
+        code_diff = summarizer.git_repo_manager.stream_changes(hexsha, lambda line: Utility.cleanTripleSlashes(Utility.cleanTripleQuotes(line)))
+        return summarizer.prepare_code_diff(hexsha, code_diff)
+
+    def build_result(self, kind, repo, commit, message, generated_commit_message):
+        result = {"commit": commit.hexsha, "message": generated_commit_message}
+        if kind == "compare":
+            from commit_analysis import CommitMsgComparison
+            # Not commit.message: GitPython's object reader is not safe to share with the prefetch thread
+            original_commit_msg = message or self.get_summarizer(repo).git_repo_manager.get_commit_message(commit.hexsha)
+            confidence = CommitMsgComparison.compare_messages(original_commit_msg, generated_commit_message)
+            result.update({
+                "original_message": original_commit_msg,
+                "confidence": confidence,
+                "passed": confidence >= self.confidence_level,
+            })
+        return result
+
+    def record_latency(self, seconds):
+        with self.latency_lock:
+            self.requests += 1
+            self.latencies.append(seconds)
+
+    @staticmethod
+    def percentile(values, percent):
+        if not values:
+            return None
+        ordered = sorted(values)
+        return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+    def stats(self):
+        from commit_analysis import CommitMsgComparison
+        with self.latency_lock:
+            latencies = list(self.latencies)
+            requests = self.requests
+        p50 = self.percentile(latencies, 50)
+        p99 = self.percentile(latencies, 99)
+        return {
+            "requests": requests,
+            "queued": self.queue.qsize(),
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p99_ms": round(p99 * 1000, 1) if p99 is not None else None,
+            "repos": self.repos,
+            "compare": CommitMsgComparison.stats(),
+            "triage": {repo: summarizer.triage.stats() for repo, summarizer in self.summarizers.items() if summarizer.triage is not None},
+        }
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    service = None
+    timeout_seconds = None
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self.send_json(200, self.service.stats())
+        elif self.path == "/health":
+            self.send_json(200, {"status": "ok"})
+        else:
+            self.send_json(404, {"error": f"Unknown endpoint {self.path}"})
+
+    def do_POST(self):
+        if self.path not in ("/summarize", "/compare"):
+            self.send_json(404, {"error": f"Unknown endpoint {self.path}"})
+            return
+
+        start = time.perf_counter()
+        try:
+            body = self.read_body()
+            future = self.service.submit(self.path.strip("/"), body.get("repo"), body.get("commit"), body.get("message"))
+            result = future.result(timeout=self.timeout_seconds)
+            self.send_json(200, result)
+        except RequestError as e:
+            self.send_json(400, {"error": str(e)})
+        except Exception as e:
+            logging.error(f"Error handling {self.path}: {e}")
+            self.send_json(500, {"error": str(e)})
+        finally:
+            self.service.record_latency(time.perf_counter() - start)
+
+    def read_body(self):
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError as e:
+            raise RequestError(f"Invalid request body: {e}") from e
+        if not isinstance(body, dict):
+            raise RequestError("The request body must be a JSON object.")
+        return body
+
+    def send_json(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logging.info("%s - %s", self.address_string(), format % args)
+
+
+def serve(console=None):
+    load_dotenv()
+    host = os.getenv("SERVE_HOST", "127.0.0.1")
+    port = int(os.getenv("SERVE_PORT", "8642"))
+
+    service = SummaryService()
+    service.start()
+
+    RequestHandler.service = service
+    RequestHandler.timeout_seconds = float(os.getenv("SERVE_TIMEOUT", "600"))
+    httpd = ThreadingHTTPServer((host, port), RequestHandler)
+
+    output = console.print if console else print
+    output(f"CheekyAI serving {', '.join(service.repos)} on http://{host}:{port}")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        stats = service.stats()
+        output(f"Served {stats['requests']} requests (p50 {stats['p50_ms']} ms, p99 {stats['p99_ms']} ms)")
@@ -0,0 +1,168 @@
+import contextvars
+import functools
+import json
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# The commit the current code works on; spans and counters are grouped by it
+current_commit = contextvars.ContextVar("current_commit", default=None)
+
+
+class NullSpan:
+    # Returned while tracing is disabled, so instrumented code costs one attribute check
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class Span:
+    __slots__ = ("tracer", "name", "attributes", "start")
+
+    def __init__(self, tracer, name, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        self.tracer.record(self.name, self.start, time.perf_counter_ns(), self.attributes)
+        return False
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+
+class Tracer:
+    # Collects timed spans and counters (tokens, bytes read from git, chunks, cache hits) for a
+    # run, grouped per commit. Disabled unless enable() is called; see --trace / --chrome-trace.
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.origin = time.perf_counter_ns()
+        self.spans = []
+        self.counters = defaultdict(lambda: defaultdict(int))
+
+    def enable(self):
+        self.reset()
+        self.enabled = True
+
+    def span(self, name, **attributes):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, attributes)
+
+    def count(self, name, value=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[current_commit.get()][name] += value
+
+    def record(self, name, start, end, attributes=None):
+        thread = threading.current_thread()
+        with self.lock:
+            self.spans.append((name, current_commit.get(), thread.ident, thread.name, start, end, attributes or {}))
+
+    @contextmanager
+    def commit_scope(self, commit):
+        token = current_commit.set(commit)
+        try:
+            yield
+        finally:
+            current_commit.reset(token)
+
+    def bind(self, function):
+        # Carries the current commit into work handed to another thread
+        if not self.enabled:
+            return function
+        return functools.partial(contextvars.copy_context().run, function)
+
+    def report(self):
+        # Per commit (or "run" for work not tied to one commit): totals per span name and counters
+        with self.lock:
+            spans = list(self.spans)
+            counters = {commit: dict(values) for commit, values in self.counters.items()}
+
+        groups = defaultdict(lambda: {"spans": {}, "counters": {}})
+        for name, commit, _, _, start, end, attributes in spans:
+            totals = groups[commit or "run"]["spans"].setdefault(name, {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "errors": 0})
+            duration_ms = (end - start) / 1e6
+            totals["count"] += 1
+            totals["total_ms"] = round(totals["total_ms"] + duration_ms, 3)
+            totals["max_ms"] = round(max(totals["max_ms"], duration_ms), 3)
+            totals["errors"] += 1 if "error" in attributes else 0
+        for commit, values in counters.items():
+            groups[commit or "run"]["counters"] = values
+
+        run = groups.pop("run", {"spans": {}, "counters": {}})
+        return {
+            "wall_seconds": round((time.perf_counter_ns() - self.origin) / 1e9, 3),
+            "run": run,
+            "commits": dict(groups),
+        }
+
+    def chrome_trace(self):
+        # Chrome trace event format, viewable in chrome://tracing or Perfetto
+        with self.lock:
+            spans = list(self.spans)
+
+        events = []
+        thread_names = {}
+        for name, commit, thread_id, thread_name, start, end, attributes in spans:
+            thread_names[thread_id] = thread_name
+            events.append({
+                "name": name,
+                "cat": name.split(".")[0],
+                "ph": "X",
+                "ts": (start - self.origin) / 1000,
+                "dur": (end - start) / 1000,
+                "pid": 1,
+                "tid": thread_id,
+                "args": dict(attributes, commit=commit) if commit else dict(attributes),
+            })
+        for thread_id, thread_name in thread_names.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": thread_id, "args": {"name": thread_name}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write(self, report_path=None, chrome_trace_path=None):
+        if report_path:
+            with open(report_path, "w") as file:
+                json.dump(self.report(), file, indent=2)
+        if chrome_trace_path:
+            with open(chrome_trace_path, "w") as file:
+                json.dump(self.chrome_trace(), file)
+
+
+tracer = Tracer()
+
+
+def traced(name):
+    # Decorator recording a span around every call while tracing is enabled
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return function(*args, **kwargs)
+            with Span(tracer, name, {}):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
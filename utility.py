@@ -1,15 +1,26 @@
 import os
 import re
+import sys
+import time
+import random
+import logging
+from typing import TYPE_CHECKING
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+
+# langchain_openai is imported on first use to keep startup fast
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
 
 load_dotenv()
 
 URI = os.getenv("URI","")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY","")
 MODEL= os.getenv("MODEL","gpt-3.5-turbo")
+TOKENIZER = os.getenv("TOKENIZER", "estimate").lower()
 
 class Utility():
+
+    _encoding = None
     
     @staticmethod
     def cleanTripleQuotes(input_string):
@@ -56,7 +67,9 @@ class Utility():
             raise ValueError("Error getting confidence.") from e
 
     @staticmethod
-    def load_LLM(**kwargs) -> ChatOpenAI:
+    def load_LLM(**kwargs) -> "ChatOpenAI":
+        from langchain_openai import ChatOpenAI
+
         model = MODEL
 
         optional_params = {
@@ -75,6 +88,60 @@ class Utility():
             **kwargs
         )
     
+    @staticmethod
+    def invoke_with_backoff(chain, chain_input, max_retries=5, base_delay=1.0, max_delay=60.0):
+        # Retry rate limited calls with exponential backoff and jitter, honouring Retry-After when given
+        from openai import RateLimitError
+
+        for attempt in range(max_retries + 1):
+            try:
+                return chain.invoke(chain_input)
+            except RateLimitError as e:
+                if attempt == max_retries:
+                    raise
+
+                delay = min(max_delay, base_delay * (2 ** attempt)) * (0.5 + random.random() / 2)
+                retry_after = e.response.headers.get("retry-after") if e.response is not None else None
+                if retry_after:
+                    try:
+                        delay = max(delay, float(retry_after))
+                    except ValueError:
+                        pass
+
+                logging.warning(f"Rate limited, retrying in {delay:.1f}s ({attempt + 1}/{max_retries})")
+                time.sleep(delay)
+
+    @staticmethod
+    def count_tokens(text: str) -> int:
+        # Local token count. The default estimate (~4 characters per token) needs no downloads;
+        # TOKENIZER=tiktoken uses the exact OpenAI encoding, which must already be cached locally.
+        if not text:
+            return 0
+
+        if TOKENIZER == "tiktoken":
+            if Utility._encoding is None:
+                import tiktoken
+                Utility._encoding = tiktoken.get_encoding("cl100k_base")
+            return len(Utility._encoding.encode(text, disallowed_special=()))
+
+        return (len(text) + 3) // 4
+
+    @staticmethod
+    def get_rss_mb() -> float:
+        # Current resident set size, falling back to the peak RSS where /proc is not available
+        try:
+            with open("/proc/self/status") as status:
+                for line in status:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            pass
+
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and kilobytes on Linux
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
     @staticmethod
     def convert_tabs_and_spaces(input_str: str) -> str:
         # Convert tabs to spaces using expandtabs
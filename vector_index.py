@@ -0,0 +1,153 @@
+import logging
+import pickle
+import tempfile
+import threading
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
+
+
+class NumpyVectorIndex:
+    # In-memory cosine similarity index over a commit's chunks. Embeddings are kept as one
+    # contiguous, L2-normalized float32 matrix per source file, so a filtered search is a
+    # single matrix-vector product followed by argpartition for the top k. With max_bytes, the
+    # sources held in memory are moved to a temporary file whenever they grow past it, and a
+    # spilled source is read back for each search over it.
+
+    def __init__(self, embedding_function, max_bytes=None):
+        self.embedding_function = embedding_function
+        self.sources = {}
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.spill_file = None
+        self.spilled = {}  # source -> (offset, length) in spill_file
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_documents(cls, documents, embedding_function, max_bytes=None, **kwargs):
+        index = cls(embedding_function, max_bytes)
+        index.add_documents(documents)
+        return index
+
+    def add_documents(self, documents):
+        if not documents:
+            return
+
+        vectors = self.normalize(np.asarray(self.embedding_function.embed_documents([doc.page_content for doc in documents]), dtype=np.float32))
+        grouped = {}
+        for row, document in enumerate(documents):
+            grouped.setdefault(document.metadata.get("source"), []).append(row)
+
+        for source, rows in grouped.items():
+            matrix = vectors[rows]
+            source_documents = [documents[row] for row in rows]
+            previous = self.sources.pop(source, None) or self.unspill(source)
+            if previous is not None:
+                previous_matrix, previous_documents = previous
+                self.size -= self.source_bytes(previous_matrix, previous_documents)
+                matrix = np.concatenate([previous_matrix, matrix])
+                source_documents = previous_documents + source_documents
+            self.sources[source] = (np.ascontiguousarray(matrix), source_documents)
+            self.size += self.source_bytes(matrix, source_documents)
+        logging.info("Indexed %d chunks of %d sources in memory", len(documents), len(grouped))
+
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            self.spill()
+
+    @staticmethod
+    def source_bytes(matrix, documents):
+        return matrix.nbytes + sum(len(document.page_content) for document in documents)
+
+    def spill(self):
+        # Moves every source held in memory to the end of the spill file
+        with self.lock:
+            if self.spill_file is None:
+                self.spill_file = tempfile.TemporaryFile(prefix="cheekyai-index-")
+            self.spill_file.seek(0, 2)
+            for source, entry in self.sources.items():
+                data = pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL)
+                self.spilled[source] = (self.spill_file.tell(), len(data))
+                self.spill_file.write(data)
+        logging.info("Moved %d sources (%.1f MB) of the vector index to disk", len(self.sources), self.size / 1048576)
+        self.sources = {}
+        self.size = 0
+
+    def load_spilled(self, source):
+        offset, length = self.spilled[source]
+        with self.lock:
+            self.spill_file.seek(offset)
+            return pickle.loads(self.spill_file.read(length))
+
+    def unspill(self, source):
+        # A spilled source that gets more chunks is read back and kept in memory again
+        if source not in self.spilled:
+            return None
+        entry = self.load_spilled(source)
+        del self.spilled[source]
+        return entry
+
+    def get_source(self, source):
+        if source in self.sources:
+            return self.sources[source]
+        if source in self.spilled:
+            return self.load_spilled(source)
+        return None
+
+    @staticmethod
+    def normalize(vectors):
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def similarity_search_with_score(self, query, k=4, source=None):
+        if source is not None:
+            entry = self.get_source(source)
+            if entry is None:
+                return []
+            matrix, documents = entry
+        elif self.sources or self.spilled:
+            entries = list(self.sources.values()) + [self.load_spilled(spilled) for spilled in self.spilled]
+            matrix = np.concatenate([matrix for matrix, _ in entries])
+            documents = [document for _, source_documents in entries for document in source_documents]
+        else:
+            return []
+
+        query_vector = self.normalize(np.asarray(self.embedding_function.embed_query(query), dtype=np.float32))
+        scores = matrix @ query_vector
+        if k < len(scores):
+            top = np.argpartition(-scores, k)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        return [(documents[row], float(scores[row])) for row in top]
+
+    def similarity_search(self, query, k=4, source=None):
+        return [document for document, _ in self.similarity_search_with_score(query, k, source)]
+
+    def as_retriever(self, search_kwargs=None):
+        # Accepts the same search_kwargs as the Chroma retriever: k and a filter on source
+        search_kwargs = search_kwargs or {}
+        source = (search_kwargs.get("filter") or {}).get("source")
+        if isinstance(source, dict):
+            source = source.get("$eq")
+        return NumpyRetriever(index=self, k=search_kwargs.get("k", 4), source=source)
+
+    def delete_collection(self):
+        self.sources.clear()
+        self.spilled.clear()
+        self.size = 0
+        if self.spill_file is not None:
+            self.spill_file.close()
+            self.spill_file = None
+
+
+class NumpyRetriever(BaseRetriever):
+    index: NumpyVectorIndex
+    k: int = 4
+    source: str = None
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _get_relevant_documents(self, query, *, run_manager: CallbackManagerForRetrieverRun):
+        return self.index.similarity_search(query, self.k, self.source)